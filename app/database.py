@@ -1,22 +1,240 @@
 from __future__ import annotations
 
-from typing import Generator
-from sqlmodel import SQLModel, create_engine, Session
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Generator, Iterable, Iterator, List, Optional, Set, TypeVar
 from pathlib import Path
 
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlmodel import create_engine, Session
+
+from .security import InvalidTokenError, TENANT_CLAIM, decode_access_token
+
+T = TypeVar("T")
+
 DB_PATH = Path("./school.db").resolve()
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+# Each school (tenant) gets its own database so writers in one school never
+# wait on another school's lock. Tenants listed here use an explicit URL; any
+# other tenant lives in TENANTS_DIR/<tenant>.db once it has been provisioned.
+DEFAULT_TENANT = "default"
+TENANTS_DIR = Path("./tenants").resolve()
+TENANT_DATABASE_URLS: Dict[str, str] = {DEFAULT_TENANT: DATABASE_URL}
+
+# The tenant is resolved from (in order) the JWT claim, this header, or the
+# subdomain of TENANT_BASE_DOMAIN, e.g. "lincoln.schools.example.org".
+TENANT_HEADER = "X-Tenant-ID"
+TENANT_BASE_DOMAIN: Optional[str] = None
+
+# Reads go to replica engines. Tenants listed here read from those URLs (for
+# example copies of the database file); every other SQLite tenant reads
+# through a read-only connection to its primary file.
+TENANT_REPLICA_URLS: Dict[str, List[str]] = {}
+
+# After a client commits a write, its reads go to the primary for this long so
+# it always sees its own changes even if a replica lags behind. The client
+# carries the time of its last write in this cookie, so any worker honours it.
+READ_YOUR_WRITES_SECONDS = 5.0
+LAST_WRITE_COOKIE = "last_write"
+
+_TENANT_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+_engines: Dict[str, Engine] = {}
+_checked_tenants: Set[str] = set()
+_replicas: Dict[str, Iterator[Engine]] = {}
+_engines_lock = threading.Lock()
+
+
+def tenant_database_url(tenant: str) -> str:
+	if tenant in TENANT_DATABASE_URLS:
+		return TENANT_DATABASE_URLS[tenant]
+	return f"sqlite:///{TENANTS_DIR / f'{tenant}.db'}"
+
+
+def tenant_exists(tenant: str) -> bool:
+	if tenant in TENANT_DATABASE_URLS or tenant in _engines:
+		return True
+	return (TENANTS_DIR / f"{tenant}.db").exists()
+
+
+def known_tenants() -> List[str]:
+	tenants = set(TENANT_DATABASE_URLS)
+	if TENANTS_DIR.exists():
+		tenants.update(p.stem for p in TENANTS_DIR.glob("*.db"))
+	return sorted(tenants)
+
+
+def get_engine(tenant: str = DEFAULT_TENANT) -> Engine:
+	"""Return the engine for a tenant, creating and caching it on first use."""
+	engine = _engines.get(tenant)
+	if engine is not None:
+		return engine
+	with _engines_lock:
+		engine = _engines.get(tenant)
+		if engine is None:
+			if tenant not in TENANT_DATABASE_URLS:
+				TENANTS_DIR.mkdir(parents=True, exist_ok=True)
+			engine = create_engine(
+				tenant_database_url(tenant),
+				echo=False,
+				connect_args={"check_same_thread": False},
+			)
+			_engines[tenant] = engine
+	return engine
+
+
+def _read_only_url(url: str) -> str:
+	parsed = make_url(url)
+	if parsed.get_backend_name() != "sqlite" or not parsed.database:
+		return url
+	path = Path(parsed.database).resolve().as_posix()
+	return f"sqlite:///file:{path}?mode=ro&uri=true"
+
+
+def get_read_engine(tenant: str = DEFAULT_TENANT) -> Engine:
+	"""Return the next read replica engine for a tenant (round robin)."""
+	replicas = _replicas.get(tenant)
+	if replicas is None:
+		with _engines_lock:
+			replicas = _replicas.get(tenant)
+			if replicas is None:
+				urls = TENANT_REPLICA_URLS.get(tenant) or [
+					_read_only_url(tenant_database_url(tenant))
+				]
+				engines = [
+					create_engine(url, echo=False, connect_args={"check_same_thread": False})
+					for url in urls
+				]
+				replicas = itertools.cycle(engines)
+				_replicas[tenant] = replicas
+	return next(replicas)
+
 
+engine = get_engine(DEFAULT_TENANT)
 
-def init_db() -> None:
-	# Import models so SQLModel is aware before creating tables
-	from . import models  # noqa: F401
-	SQLModel.metadata.create_all(engine)
 
+def init_db(tenant: str = DEFAULT_TENANT) -> None:
+	"""Create or upgrade a tenant's schema. Run out of band, not on worker boot."""
+	from .migrations import upgrade
+	upgrade(get_engine(tenant))
 
-def get_session() -> Generator[Session, None, None]:
-	with Session(engine) as session:
+
+def check_db(tenant: str = DEFAULT_TENANT) -> None:
+	"""Fail fast if a tenant's schema version is not the one this code expects."""
+	from .migrations import ensure_current
+	ensure_current(get_engine(tenant))
+	_checked_tenants.add(tenant)
+
+
+def _tenant_from_token(request: Request) -> Optional[str]:
+	authorization = request.headers.get("authorization", "")
+	scheme, _, token = authorization.partition(" ")
+	if scheme.lower() != "bearer" or not token:
+		return None
+	try:
+		payload = decode_access_token(token)
+	except InvalidTokenError:
+		# Invalid tokens are rejected by the auth dependencies themselves
+		return None
+	return payload.get(TENANT_CLAIM)
+
+
+def _tenant_from_host(request: Request) -> Optional[str]:
+	if not TENANT_BASE_DOMAIN:
+		return None
+	host = request.headers.get("host", "").split(":", 1)[0].lower()
+	suffix = "." + TENANT_BASE_DOMAIN.lower()
+	if not host.endswith(suffix):
+		return None
+	subdomain = host[: -len(suffix)]
+	return subdomain or None
+
+
+def get_tenant(request: Request) -> str:
+	claimed = _tenant_from_token(request)
+	requested = request.headers.get(TENANT_HEADER) or _tenant_from_host(request)
+	if requested is not None:
+		requested = requested.strip().lower()
+	if claimed and requested and claimed != requested:
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN,
+			detail="Token is not valid for this tenant",
+		)
+	tenant = claimed or requested or DEFAULT_TENANT
+	if not _TENANT_RE.match(tenant) or not tenant_exists(tenant):
+		raise HTTPException(status_code=404, detail="Unknown tenant")
+	if tenant not in _checked_tenants:
+		from .migrations import SchemaOutOfDateError
+		try:
+			check_db(tenant)
+		except SchemaOutOfDateError:
+			raise HTTPException(
+				status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+				detail="Tenant database is not migrated",
+			)
+	return tenant
+
+
+def _mark_write(response: Response) -> None:
+	response.set_cookie(
+		LAST_WRITE_COOKIE,
+		f"{time.time():.3f}",
+		max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+		httponly=True,
+		samesite="lax",
+	)
+
+
+def _wrote_recently(request: Request) -> bool:
+	try:
+		written_at = float(request.cookies.get(LAST_WRITE_COOKIE, ""))
+	except ValueError:
+		return False
+	# Wall-clock time, since another worker may have committed the write;
+	# abs() tolerates clock skew between hosts
+	return abs(time.time() - written_at) < READ_YOUR_WRITES_SECONDS
+
+
+def get_write_session(
+	response: Response, tenant: str = Depends(get_tenant)
+) -> Generator[Session, None, None]:
+	with Session(get_engine(tenant)) as session:
+		event.listen(session, "after_commit", lambda _: _mark_write(response))
+		yield session
+
+
+def get_read_session(
+	request: Request, tenant: str = Depends(get_tenant)
+) -> Generator[Session, None, None]:
+	if _wrote_recently(request):
+		read_engine = get_engine(tenant)
+	else:
+		read_engine = get_read_engine(tenant)
+	with Session(read_engine) as session:
 		yield session
 
+
+def fan_out(
+	fn: Callable[[Session], T],
+	tenants: Optional[Iterable[str]] = None,
+	max_workers: int = 8,
+) -> Dict[str, T]:
+	"""Run ``fn`` against every tenant's database in parallel.
+
+	Used for district-wide reports; returns a mapping of tenant to result.
+	"""
+	targets = list(tenants) if tenants is not None else known_tenants()
+
+	def run(tenant: str) -> T:
+		with Session(get_engine(tenant)) as session:
+			return fn(session)
+
+	with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as pool:
+		results = pool.map(run, targets)
+		return dict(zip(targets, results))
@@ -0,0 +1,232 @@
+"""Per-student GPA aggregate and class rank.
+
+``student_gpa`` holds each student's summed grade points and graded-class
+count. Grade changes, enrollments and unenrollments adjust it with a single
+upsert in the same transaction, so reading a GPA never touches
+``enrollment``. Archived enrollments keep counting because archiving moves
+rows without changing grades.
+
+Ranks come from :class:`StudentRankings`, a per-tenant sorted list of
+``(-gpa, student_id)``. A rank is one bisect and top-N is a slice. Writes
+update the list right after they commit. Each process also rebuilds it from
+``student_gpa`` in a background thread once it is older than
+``RANKING_REFRESH_SECONDS``, which picks up writes made by other workers.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from .database import get_engine
+from .models import StudentGpa
+
+# Points are stored in tenths so sums stay exact integers
+GRADE_POINTS: Dict[str, int] = {
+	"A+": 40, "A": 40, "A-": 37,
+	"B+": 33, "B": 30, "B-": 27,
+	"C+": 23, "C": 20, "C-": 17,
+	"D+": 13, "D": 10, "D-": 7,
+	"F": 0,
+}
+
+RANKING_REFRESH_SECONDS = 60.0
+MAX_RANKING_LIMIT = 1000
+
+
+def grade_points(grade: Optional[str]) -> Optional[int]:
+	"""Grade points in tenths, or None for ungraded or non-letter grades"""
+	if grade is None:
+		return None
+	return GRADE_POINTS.get(grade.strip().upper())
+
+
+def record_grade_change(
+	session: Session, student_id: int, old: Optional[str], new: Optional[str]
+) -> bool:
+	"""Apply a grade going from ``old`` to ``new`` (None for no enrollment or no grade).
+
+	Returns whether the student's aggregate changed; the caller commits.
+	"""
+	old_points, new_points = grade_points(old), grade_points(new)
+	points = (new_points or 0) - (old_points or 0)
+	count = (new_points is not None) - (old_points is not None)
+	if not points and not count:
+		return False
+	table = StudentGpa.__table__  # type: ignore[attr-defined]
+	statement = insert(table).values(
+		student_id=student_id,
+		points_tenths=points,
+		graded_count=count,
+		gpa=points / (10.0 * count) if count > 0 else None,
+	)
+	statement = statement.on_conflict_do_update(
+		index_elements=[table.c.student_id],
+		set_={
+			"points_tenths": table.c.points_tenths + points,
+			"graded_count": table.c.graded_count + count,
+			"gpa": (table.c.points_tenths + points) / (10.0 * func.nullif(table.c.graded_count + count, 0)),
+		},
+	)
+	session.connection().execute(statement)
+	return True
+
+
+def forget_student(session: Session, student_id: int) -> None:
+	session.exec(delete(StudentGpa).where(StudentGpa.student_id == student_id))  # type: ignore[call-overload]
+
+
+def rebuild_student_gpa(session: Session) -> None:
+	"""Recompute every aggregate from ``enrollment`` and ``enrollment_archive``"""
+	cases = " ".join(f"WHEN '{grade}' THEN {points}" for grade, points in GRADE_POINTS.items())
+	points = f"CASE UPPER(TRIM(grade)) {cases} END"
+	conn = session.connection()
+	conn.execute(text("DELETE FROM student_gpa"))
+	conn.execute(text(
+		"INSERT INTO student_gpa (student_id, points_tenths, graded_count, gpa) "
+		"SELECT student_id, SUM(points), COUNT(*), SUM(points) / (10.0 * COUNT(*)) FROM ("
+		f"SELECT student_id, {points} AS points FROM enrollment "
+		f"UNION ALL SELECT student_id, {points} AS points FROM enrollment_archive"
+		") WHERE points IS NOT NULL GROUP BY student_id"
+	))
+
+
+class StudentRankings:
+	"""Students with a GPA ordered best first; ties share a rank (1, 2, 2, 4)"""
+
+	def __init__(self) -> None:
+		self._keys: List[Tuple[float, int]] = []
+		self._gpa: Dict[int, float] = {}
+		self._lock = threading.Lock()
+		# Held by whoever is rebuilding the list from the database
+		self.reload_lock = threading.Lock()
+		# Changes that arrive while a reload runs, replayed onto the new list
+		self._replay: Optional[List[Tuple[int, Optional[float]]]] = None
+		self.loaded_at: Optional[float] = None
+
+	def __len__(self) -> int:
+		return len(self._keys)
+
+	def is_stale(self) -> bool:
+		return self.loaded_at is None or time.monotonic() - self.loaded_at > RANKING_REFRESH_SECONDS
+
+	def begin_reload(self) -> None:
+		"""Call before reading the rows that will be passed to :meth:`load`"""
+		with self._lock:
+			self._replay = []
+
+	def abort_reload(self) -> None:
+		with self._lock:
+			self._replay = None
+
+	def load(self, rows: List[Tuple[int, float]]) -> None:
+		# Sorting 100k rows takes a while; readers keep using the old list meanwhile
+		gpa = dict(rows)
+		keys = sorted((-value, student_id) for student_id, value in gpa.items())
+		with self._lock:
+			for student_id, value in self._replay or ():
+				_apply(gpa, keys, student_id, value)
+			self._gpa, self._keys = gpa, keys
+			self._replay = None
+			self.loaded_at = time.monotonic()
+
+	def set(self, student_id: int, gpa: Optional[float]) -> None:
+		with self._lock:
+			_apply(self._gpa, self._keys, student_id, gpa)
+			if self._replay is not None:
+				self._replay.append((student_id, gpa))
+
+	def _rank_of(self, gpa: float) -> int:
+		return bisect.bisect_left(self._keys, (-gpa,)) + 1
+
+	def rank(self, student_id: int) -> Optional[int]:
+		with self._lock:
+			gpa = self._gpa.get(student_id)
+			return None if gpa is None else self._rank_of(gpa)
+
+	def top(self, limit: int) -> List[Tuple[int, int, float]]:
+		"""``(rank, student_id, gpa)`` for the best ``limit`` students"""
+		with self._lock:
+			results: List[Tuple[int, int, float]] = []
+			rank = 0
+			previous: Optional[float] = None
+			for position, (negative_gpa, student_id) in enumerate(self._keys[:limit], start=1):
+				if negative_gpa != previous:
+					rank, previous = position, negative_gpa
+				results.append((rank, student_id, -negative_gpa))
+			return results
+
+
+def _apply(gpa: Dict[int, float], keys: List[Tuple[float, int]], student_id: int, value: Optional[float]) -> None:
+	old = gpa.pop(student_id, None)
+	if old is not None:
+		index = bisect.bisect_left(keys, (-old, student_id))
+		if index < len(keys) and keys[index] == (-old, student_id):
+			del keys[index]
+	if value is not None:
+		gpa[student_id] = value
+		bisect.insort(keys, (-value, student_id))
+
+
+_rankings: Dict[str, StudentRankings] = {}
+# Only guards creating a tenant's entry; each tenant reloads under its own lock
+_rankings_lock = threading.Lock()
+
+
+def _reload(rankings: StudentRankings, session: Session) -> None:
+	rankings.begin_reload()
+	try:
+		rows = session.exec(
+			select(StudentGpa.student_id, StudentGpa.gpa).where(StudentGpa.gpa != None)  # noqa: E711
+		).all()
+	except BaseException:
+		rankings.abort_reload()
+		raise
+	rankings.load([(student_id, gpa) for student_id, gpa in rows])
+
+
+def _refresh_in_background(tenant: str, rankings: StudentRankings) -> None:
+	try:
+		# The primary, so a lagging replica cannot undo changes already applied
+		with Session(get_engine(tenant)) as session:
+			_reload(rankings, session)
+	finally:
+		rankings.reload_lock.release()
+
+
+def get_rankings(tenant: str, session: Session) -> StudentRankings:
+	"""The tenant's rankings, loaded from ``student_gpa`` on first use.
+
+	Only the first load makes callers wait. After that a stale list keeps
+	being served while a background thread rebuilds it.
+	"""
+	rankings = _rankings.get(tenant)
+	if rankings is None:
+		with _rankings_lock:
+			rankings = _rankings.setdefault(tenant, StudentRankings())
+	if rankings.loaded_at is None:
+		with rankings.reload_lock:
+			if rankings.loaded_at is None:
+				_reload(rankings, session)
+	elif rankings.is_stale() and rankings.reload_lock.acquire(blocking=False):
+		threading.Thread(
+			target=_refresh_in_background,
+			args=(tenant, rankings),
+			name=f"rankings-{tenant}",
+			daemon=True,
+		).start()
+	return rankings
+
+
+def update_ranking(tenant: str, session: Session, student_id: int) -> None:
+	"""Call after committing a change from :func:`record_grade_change` or :func:`forget_student`"""
+	rankings = _rankings.get(tenant)
+	if rankings is None:
+		return  # loaded fresh on first use
+	aggregate = session.get(StudentGpa, student_id)
+	rankings.set(student_id, aggregate.gpa if aggregate else None)
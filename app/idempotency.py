@@ -0,0 +1,192 @@
+"""Idempotency keys for mutating requests.
+
+A client that retries a ``POST``, ``PUT``, ``PATCH`` or ``DELETE`` with the
+same ``Idempotency-Key`` header gets the stored response of the first
+attempt instead of running the endpoint again. Keys are scoped to the
+tenant, credentials, method and path of the request, so two clients cannot
+see each other's responses.
+
+Keys live in the tenant's ``idempotency_key`` table, so a retry that lands
+on another worker is still recognised. Claiming a key is an ``INSERT`` into
+that table; while the first attempt is still running, retries poll its row
+rather than racing it into the database. Reusing a key with a different
+body or query string is rejected with ``422``. 5xx and 429 responses are
+not stored, so those can be retried for real.
+
+Keys expire after ``IDEMPOTENCY_TTL_SECONDS``. A claim that was never
+completed (its worker died) is dropped after ``ABANDONED_CLAIM_SECONDS``.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import get_engine, get_tenant
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+MAX_KEY_LENGTH = 255
+# How long a retry waits for the first attempt before giving up with 409
+IN_FLIGHT_WAIT_SECONDS = 30.0
+IN_FLIGHT_POLL_SECONDS = 0.1
+# An unfinished claim this old belongs to a worker that died mid-request
+ABANDONED_CLAIM_SECONDS = 5 * 60
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+_table = IdempotencyKey.__table__  # type: ignore[attr-defined]
+
+
+def _claim(tenant: str, key: str, fingerprint: str) -> Tuple[bool, Optional[IdempotencyKey]]:
+	"""Claim ``key`` for this attempt.
+
+	Returns ``(True, None)`` when claimed, otherwise ``(False, row)`` with the
+	existing row, which is None if it was released in the meantime.
+	"""
+	now = datetime.now(timezone.utc)
+	with Session(get_engine(tenant)) as session:
+		conn = session.connection()
+		conn.execute(delete(_table).where(or_(
+			_table.c.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+			and_(
+				_table.c.completed_at == None,  # noqa: E711
+				_table.c.created_at < now - timedelta(seconds=ABANDONED_CLAIM_SECONDS),
+			),
+		)))
+		claimed = conn.execute(
+			insert(_table)
+			.values(key=key, fingerprint=fingerprint, created_at=now)
+			.on_conflict_do_nothing(index_elements=[_table.c.key])
+		)
+		session.commit()
+		if claimed.rowcount == 1:
+			return True, None
+		return False, session.get(IdempotencyKey, key)
+
+
+def _complete(tenant: str, key: str, response: Response, body: bytes) -> None:
+	headers = [[name.decode("latin-1"), value.decode("latin-1")] for name, value in response.raw_headers]
+	with Session(get_engine(tenant)) as session:
+		session.exec(  # type: ignore[call-overload]
+			update(IdempotencyKey)
+			.where(IdempotencyKey.key == key)
+			.values(
+				completed_at=datetime.now(timezone.utc),
+				status_code=response.status_code,
+				headers=json.dumps(headers),
+				body=body,
+			)
+		)
+		session.commit()
+
+
+def _release(tenant: str, key: str) -> None:
+	"""Forget an attempt whose response should not be replayed"""
+	with Session(get_engine(tenant)) as session:
+		session.exec(  # type: ignore[call-overload]
+			delete(IdempotencyKey).where(
+				IdempotencyKey.key == key,
+				IdempotencyKey.completed_at == None,  # noqa: E711
+			)
+		)
+		session.commit()
+
+
+def _scope_key(request: Request, key: str) -> str:
+	# The tenant is implied by the database the key is stored in
+	parts = [
+		request.headers.get("authorization", ""),
+		request.headers.get("x-admin-key", ""),
+		request.method,
+		request.url.path,
+		key,
+	]
+	# Hashed so the table never holds bearer tokens
+	return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def _replay(stored: IdempotencyKey) -> Response:
+	response = Response(content=stored.body or b"", status_code=stored.status_code or status.HTTP_200_OK)
+	response.raw_headers = [
+		(name.encode("latin-1"), value.encode("latin-1"))
+		for name, value in json.loads(stored.headers or "[]")
+	] + [(REPLAYED_HEADER.lower().encode(), b"true")]
+	return response
+
+
+def _error(status_code: int, detail: str) -> Response:
+	return JSONResponse({"detail": detail}, status_code=status_code)
+
+
+def install(app: FastAPI) -> None:
+	"""Honour ``Idempotency-Key`` on mutating requests; requests without it are untouched"""
+
+	@app.middleware("http")
+	async def idempotent_requests(request: Request, call_next):  # type: ignore[no-untyped-def]
+		key = request.headers.get(IDEMPOTENCY_HEADER)
+		if key is None or request.method not in MUTATING_METHODS:
+			return await call_next(request)
+		if not key or len(key) > MAX_KEY_LENGTH:
+			return _error(
+				status.HTTP_400_BAD_REQUEST,
+				f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters",
+			)
+		try:
+			tenant = await run_in_threadpool(get_tenant, request)
+		except HTTPException:
+			# Unknown or unmigrated tenant: the endpoint answers with the same error
+			return await call_next(request)
+
+		scope_key = _scope_key(request, key)
+		body = await request.body()
+		fingerprint = hashlib.sha256(request.url.query.encode() + b"\0" + body).hexdigest()
+
+		deadline = time.monotonic() + IN_FLIGHT_WAIT_SECONDS
+		while True:
+			claimed, stored = await run_in_threadpool(_claim, tenant, scope_key, fingerprint)
+			if claimed:
+				break
+			if stored is None:
+				continue  # released between our insert and read; claim it again
+			if stored.fingerprint != fingerprint:
+				return _error(
+					status.HTTP_422_UNPROCESSABLE_ENTITY,
+					f"{IDEMPOTENCY_HEADER} was already used for a different request",
+				)
+			if stored.completed_at is not None:
+				return _replay(stored)
+			if time.monotonic() >= deadline:
+				return _error(
+					status.HTTP_409_CONFLICT,
+					f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+				)
+			# The first attempt may be running on another worker
+			await asyncio.sleep(IN_FLIGHT_POLL_SECONDS)
+
+		try:
+			response = await call_next(request)
+			content = b"".join([chunk async for chunk in response.body_iterator])
+		except BaseException:
+			await run_in_threadpool(_release, tenant, scope_key)
+			raise
+		if response.status_code >= 500 or response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+			await run_in_threadpool(_release, tenant, scope_key)
+		else:
+			await run_in_threadpool(_complete, tenant, scope_key, response, content)
+		# The body iterator is spent; hand back the buffered copy
+		buffered = Response(content=content, status_code=response.status_code)
+		buffered.raw_headers = list(response.raw_headers)
+		return buffered
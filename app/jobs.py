@@ -0,0 +1,352 @@
+"""In-process background jobs.
+
+Jobs are persisted in the ``job`` table of the tenant that submitted them and
+run on a small bounded thread pool, so long operations (bulk password resets
+today; seeding, imports and exports later) stay off the request path.
+Handlers report progress through :class:`JobContext` and are cancelled
+cooperatively between batches.
+
+Each job row records the process that accepted it (``owner``), which keeps
+``heartbeat_at`` fresh while the job is queued or running. Jobs whose owner
+stopped heartbeating died with their process; :func:`recover_jobs` fails
+them, either from a live worker's heartbeat thread or out of band::
+
+	python -m app.jobs recover [--tenant NAME | --all-tenants]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import bindparam, or_, update
+from sqlmodel import Session, select
+
+from .database import get_engine
+from .models import Enrollment, Job, JobStatus, Student
+from .security import decrypt_secret, encrypt_secret, generate_temp_password, get_password_hash
+
+JOB_WORKERS = 2
+# Jobs accepted but not yet finished; submissions beyond this are refused
+JOB_QUEUE_LIMIT = 100
+
+# bcrypt releases the GIL while hashing, so threads spread hashing across cores
+HASH_WORKERS = os.cpu_count() or 2
+PASSWORD_RESET_BATCH = 100
+
+# How long a finished job's secret can be collected before it is dropped
+JOB_SECRET_RETENTION_SECONDS = 15 * 60
+
+JOB_HEARTBEAT_SECONDS = 30.0
+# A queued or running job without a heartbeat for this long has lost its process
+JOB_ORPHAN_SECONDS = 5 * 60
+
+# Written to job.owner; unique per process, so a restarted worker is a new owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+PASSWORD_RESET = "password_reset"
+
+
+class JobQueueFull(Exception):
+	pass
+
+
+class JobCancelled(Exception):
+	pass
+
+
+class JobContext:
+	"""Handed to job handlers for progress reporting and cancellation checks"""
+
+	def __init__(self, session: Session, job: Job) -> None:
+		self.session = session
+		self.job = job
+		self.result: Any = None
+		# Stored encrypted and handed out by the first result read only
+		self.secret: Any = None
+
+	def set_total(self, total: int) -> None:
+		self.job.total = total
+		self._save()
+
+	def advance(self, count: int) -> None:
+		self.job.progress += count
+		self._save()
+
+	def check_cancelled(self) -> None:
+		self.session.refresh(self.job)
+		if self.job.cancel_requested:
+			raise JobCancelled()
+
+	def _save(self) -> None:
+		self.job.heartbeat_at = datetime.now(timezone.utc)
+		self.session.add(self.job)
+		self.session.commit()
+
+
+JobHandler = Callable[[JobContext, Dict[str, Any]], Any]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash")
+_slots = threading.BoundedSemaphore(JOB_QUEUE_LIMIT)
+
+# Tenant -> jobs this process accepted and has not finished; heartbeated
+_live: Dict[str, int] = {}
+_live_lock = threading.Lock()
+_heartbeat_thread: Optional[threading.Thread] = None
+_stopping = threading.Event()
+
+_UNFINISHED = [JobStatus.QUEUED, JobStatus.RUNNING]
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+	def register(fn: JobHandler) -> JobHandler:
+		JOB_HANDLERS[kind] = fn
+		return fn
+	return register
+
+
+def submit_job(tenant: str, kind: str, params: Dict[str, Any]) -> Job:
+	if kind not in JOB_HANDLERS:
+		raise ValueError(f"Unknown job kind: {kind}")
+	if not _slots.acquire(blocking=False):
+		raise JobQueueFull()
+	try:
+		with Session(get_engine(tenant)) as session:
+			job = Job(
+				kind=kind,
+				params=json.dumps(params),
+				owner=WORKER_ID,
+				heartbeat_at=datetime.now(timezone.utc),
+			)
+			session.add(job)
+			session.commit()
+			session.refresh(job)
+		_track(tenant, 1)
+		try:
+			_executor.submit(_run, tenant, job.id)  # type: ignore[arg-type]
+		except BaseException:
+			_track(tenant, -1)
+			raise
+	except BaseException:
+		_slots.release()
+		raise
+	return job
+
+
+def _track(tenant: str, delta: int) -> None:
+	global _heartbeat_thread
+	with _live_lock:
+		_live[tenant] = _live.get(tenant, 0) + delta
+		if not _live[tenant]:
+			del _live[tenant]
+		if _heartbeat_thread is None:
+			_heartbeat_thread = threading.Thread(target=_heartbeat, name="job-heartbeat", daemon=True)
+			_heartbeat_thread.start()
+
+
+def _heartbeat() -> None:
+	"""Keep this process's jobs alive and fail jobs whose owner has gone"""
+	while not _stopping.wait(JOB_HEARTBEAT_SECONDS):
+		with _live_lock:
+			tenants = list(_live)
+		for tenant in tenants:
+			try:
+				with Session(get_engine(tenant)) as session:
+					session.exec(  # type: ignore[call-overload]
+						update(Job)
+						.where(Job.owner == WORKER_ID, Job.status.in_(_UNFINISHED))  # type: ignore[attr-defined]
+						.values(heartbeat_at=datetime.now(timezone.utc))
+					)
+					session.commit()
+					recover_jobs(session)
+			except Exception:
+				# A busy database just delays this beat; the orphan timeout spans many
+				continue
+
+
+def request_cancel(session: Session, job: Job) -> Job:
+	"""Queued jobs are cancelled at once; running jobs stop at their next batch"""
+	if job.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+		job.cancel_requested = True
+		if job.status == JobStatus.QUEUED:
+			job.status = JobStatus.CANCELLED
+			job.finished_at = datetime.now(timezone.utc)
+		session.add(job)
+		session.commit()
+		session.refresh(job)
+	return job
+
+
+def take_secret(session: Session, job: Job) -> Any:
+	"""Hand out a finished job's secret once; None if already taken or expired"""
+	token = job.secret
+	if token is None:
+		return None
+	# Conditional clear so two concurrent reads cannot both receive it
+	cleared = session.exec(  # type: ignore[call-overload]
+		update(Job).where(Job.id == job.id, Job.secret == token).values(secret=None)
+	)
+	session.commit()
+	if cleared.rowcount != 1:
+		return None
+	plaintext = decrypt_secret(token, JOB_SECRET_RETENTION_SECONDS)
+	return json.loads(plaintext) if plaintext is not None else None
+
+
+def _run(tenant: str, job_id: int) -> None:
+	try:
+		with Session(get_engine(tenant)) as session:
+			# Conditional, so a job cancelled or recovered meanwhile is left alone
+			now = datetime.now(timezone.utc)
+			claimed = session.exec(  # type: ignore[call-overload]
+				update(Job)
+				.where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+				.values(status=JobStatus.RUNNING, started_at=now, heartbeat_at=now)
+			)
+			session.commit()
+			job = session.get(Job, job_id)
+			if claimed.rowcount != 1 or not job:
+				return
+
+			context = JobContext(session, job)
+			try:
+				result = JOB_HANDLERS[job.kind](context, json.loads(job.params or "{}"))
+			except JobCancelled:
+				session.rollback()
+				job.status = JobStatus.CANCELLED
+				result = context.result
+			except Exception as exc:
+				session.rollback()
+				job.status = JobStatus.FAILED
+				job.error = str(exc)
+				result = context.result
+			else:
+				job.status = JobStatus.SUCCEEDED
+			if result is not None:
+				job.result = json.dumps(result)
+			if context.secret is not None:
+				job.secret = encrypt_secret(json.dumps(context.secret))
+			job.finished_at = datetime.now(timezone.utc)
+			session.add(job)
+			session.commit()
+	finally:
+		_track(tenant, -1)
+		_slots.release()
+
+
+def recover_jobs(session: Session) -> int:
+	"""Fail queued or running jobs whose owner stopped heartbeating.
+
+	Their process is gone, so they would otherwise never finish. Jobs of
+	live workers are untouched, so this is safe to run at any time. Also
+	drops secrets that outlived their retention. Returns the number of jobs
+	failed.
+	"""
+	now = datetime.now(timezone.utc)
+	orphaned = session.exec(  # type: ignore[call-overload]
+		update(Job)
+		.where(
+			Job.status.in_(_UNFINISHED),  # type: ignore[attr-defined]
+			or_(
+				Job.heartbeat_at == None,  # noqa: E711
+				Job.heartbeat_at < now - timedelta(seconds=JOB_ORPHAN_SECONDS),
+			),
+		)
+		.values(status=JobStatus.FAILED, error="Its worker stopped before the job finished", finished_at=now)
+	)
+	session.exec(  # type: ignore[call-overload]
+		update(Job)
+		.where(Job.secret != None, Job.finished_at < now - timedelta(seconds=JOB_SECRET_RETENTION_SECONDS))  # noqa: E711
+		.values(secret=None)
+	)
+	session.commit()
+	return orphaned.rowcount
+
+
+def shutdown() -> None:
+	_stopping.set()
+	_executor.shutdown(wait=False, cancel_futures=True)
+	_hash_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _password_reset_targets(session: Session, params: Dict[str, Any]) -> List[int]:
+	if params.get("all"):
+		query = select(Student.id)
+	elif params.get("section_id") is not None:
+		query = select(Enrollment.student_id).where(Enrollment.section_id == params["section_id"])
+	else:
+		return list(dict.fromkeys(params.get("student_ids") or []))
+	return list(dict.fromkeys(session.exec(query).all()))
+
+
+@job_handler(PASSWORD_RESET)
+def reset_passwords(context: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+	"""Give each selected student a new temporary password.
+
+	Hashes each batch on the hash pool and writes it in one executemany, so
+	a cancelled job leaves every finished batch committed. The result counts
+	the resets; the new passwords, keyed by student ID, are the job's secret.
+	"""
+	session = context.session
+	student_ids = _password_reset_targets(session, params)
+	context.set_total(len(student_ids))
+
+	passwords: Dict[str, str] = {}
+	missing: List[int] = []
+	# Published up front so a cancelled or failed job still reports the
+	# passwords of the batches it already committed
+	context.result = {"reset": 0, "missing": missing}
+	context.secret = {"passwords": passwords}
+
+	table = Student.__table__  # type: ignore[attr-defined]
+	statement = (
+		update(table)
+		.where(table.c.id == bindparam("student_id"))
+		.values(password_hash=bindparam("new_hash"))
+	)
+	for start in range(0, len(student_ids), PASSWORD_RESET_BATCH):
+		context.check_cancelled()
+		batch = student_ids[start:start + PASSWORD_RESET_BATCH]
+		existing = set(session.exec(select(Student.id).where(Student.id.in_(batch))).all())
+		found = [i for i in batch if i in existing]
+
+		new_passwords = [generate_temp_password() for _ in found]
+		hashes = list(_hash_pool.map(get_password_hash, new_passwords))
+		if found:
+			session.connection().execute(
+				statement,
+				[{"student_id": i, "new_hash": h} for i, h in zip(found, hashes)],
+			)
+		# Commits the batch together with the progress update
+		context.advance(len(batch))
+		passwords.update((str(i), p) for i, p in zip(found, new_passwords))
+		missing.extend(i for i in batch if i not in existing)
+		context.result["reset"] = len(passwords)
+	return context.result
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+	from .database import DEFAULT_TENANT, fan_out, known_tenants
+
+	parser = argparse.ArgumentParser(prog="python -m app.jobs")
+	parser.add_argument("command", choices=["recover"])
+	target = parser.add_mutually_exclusive_group()
+	target.add_argument("--tenant", default=DEFAULT_TENANT)
+	target.add_argument("--all-tenants", action="store_true")
+	args = parser.parse_args(argv)
+
+	tenants = known_tenants() if args.all_tenants else [args.tenant]
+	for tenant, failed in fan_out(recover_jobs, tenants).items():
+		print(f"{tenant}: failed {failed} orphaned job(s)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,150 @@
+"""Batched relationship loading for ``expand=`` parameters.
+
+Each loader collects every key it is asked for and resolves them with a
+single ``IN`` query, so expanding a relationship costs one query per request
+rather than one per row.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import (
+	Callable,
+	Dict,
+	Generic,
+	Hashable,
+	Iterable,
+	Iterator,
+	List,
+	Optional,
+	Sequence,
+	Set,
+	Tuple,
+	Type,
+	TypeVar,
+	Union,
+)
+
+from fastapi import HTTPException
+from sqlmodel import Session, SQLModel, select
+
+from .models import Enrollment, EnrollmentArchive, Section, Student
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+M = TypeVar("M", bound=SQLModel)
+
+# SQLite's default limit on bound parameters per statement is 999
+MAX_IN_PARAMS = 900
+
+
+def chunked(keys: Sequence[K], size: int = MAX_IN_PARAMS) -> Iterator[Sequence[K]]:
+	for start in range(0, len(keys), size):
+		yield keys[start:start + size]
+
+
+def parse_expand(expand: Optional[str], allowed: Iterable[str]) -> Set[str]:
+	if not expand:
+		return set()
+	requested = {name.strip() for name in expand.split(",") if name.strip()}
+	unknown = requested - set(allowed)
+	if unknown:
+		raise HTTPException(
+			status_code=400,
+			detail=f"Unknown expansion(s): {', '.join(sorted(unknown))}",
+		)
+	return requested
+
+
+class BatchLoader(Generic[K, V]):
+	"""DataLoader-style batcher: queue keys, then resolve them all at once."""
+
+	def __init__(
+		self,
+		batch_fn: Callable[[List[K]], Dict[K, V]],
+		default: Optional[Callable[[], V]] = None,
+	) -> None:
+		self._batch_fn = batch_fn
+		self._default = default
+		self._pending: Set[K] = set()
+		self._cache: Dict[K, V] = {}
+
+	def load(self, key: K) -> None:
+		if key not in self._cache:
+			self._pending.add(key)
+
+	def load_many(self, keys: Iterable[K]) -> None:
+		for key in keys:
+			self.load(key)
+
+	def dispatch(self) -> None:
+		if not self._pending:
+			return
+		keys = sorted(self._pending)  # type: ignore[type-var]
+		self._pending.clear()
+		for chunk in chunked(keys):
+			self._cache.update(self._batch_fn(list(chunk)))
+
+	def get(self, key: K) -> Optional[V]:
+		if key in self._pending:
+			self.dispatch()
+		if key in self._cache:
+			return self._cache[key]
+		return self._default() if self._default else None
+
+
+def by_id_loader(session: Session, model: Type[M]) -> BatchLoader[int, M]:
+	def batch(ids: List[int]) -> Dict[int, M]:
+		rows = session.exec(select(model).where(model.id.in_(ids))).all()  # type: ignore[attr-defined]
+		return {row.id: row for row in rows}  # type: ignore[attr-defined]
+	return BatchLoader(batch)
+
+
+def fetch_by_ids(session: Session, model: Type[M], ids: Sequence[int]) -> Tuple[List[M], List[int]]:
+	"""Look up many rows by primary key.
+
+	Returns the rows found, in request order, and the requested IDs that do
+	not exist. Duplicate IDs are returned once.
+	"""
+	unique = list(dict.fromkeys(ids))
+	loader = by_id_loader(session, model)
+	loader.load_many(unique)
+	loader.dispatch()
+	items: List[M] = []
+	missing: List[int] = []
+	for key in unique:
+		row = loader.get(key)
+		if row is None:
+			missing.append(key)
+		else:
+			items.append(row)
+	return items, missing
+
+
+def students_by_section_loader(
+	session: Session,
+	source: Union[Type[Enrollment], Type[EnrollmentArchive]] = Enrollment,
+) -> BatchLoader[int, List[Student]]:
+	"""``source`` is the section's term's enrollment table, see ``app.terms.enrollment_table``"""
+	def batch(section_ids: List[int]) -> Dict[int, List[Student]]:
+		rows = session.exec(
+			select(source.section_id, Student)
+			.join(Student, Student.id == source.student_id)
+			.where(source.section_id.in_(section_ids))  # type: ignore[attr-defined]
+		).all()
+		grouped: Dict[int, List[Student]] = defaultdict(list)
+		for section_id, student in rows:
+			grouped[section_id].append(student)
+		return grouped
+	return BatchLoader(batch, default=list)
+
+
+def sections_by_teacher_loader(session: Session, term_id: int) -> BatchLoader[int, List[Section]]:
+	def batch(teacher_ids: List[int]) -> Dict[int, List[Section]]:
+		rows = session.exec(
+			select(Section).where(Section.teacher_id.in_(teacher_ids), Section.term_id == term_id)  # type: ignore[attr-defined]
+		).all()
+		grouped: Dict[int, List[Section]] = defaultdict(list)
+		for section in rows:
+			grouped[section.teacher_id].append(section)
+		return grouped
+	return BatchLoader(batch, default=list)
@@ -3,11 +3,18 @@ from __future__ import annotations
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .database import init_db
-from .routers import students, teachers, courses, sections, enrollments, auth
+from .database import check_db
+from .idempotency import install as install_idempotency
+from .jobs import shutdown as shutdown_jobs
+from .profiling import install as install_profiling
+from .routers import students, teachers, courses, sections, enrollments, auth, jobs, profiles, terms
 
 app = FastAPI(title="School System API", version="0.3.0")
 
+# Installed before CORS so CORS wraps it and its own 400/409/422 answers
+# still carry the CORS headers browsers need to read them
+install_idempotency(app)
+
 # Allow the frontend (opened from file:// or another origin) to call this API
 app.add_middleware(
 	CORSMiddleware,
@@ -20,7 +27,13 @@ app.add_middleware(
 
 @app.on_event("startup")
 def on_startup() -> None:
-	init_db()
+	# Only compare the schema version; migrations run out of band
+	check_db()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+	shutdown_jobs()
 
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -29,3 +42,9 @@ app.include_router(teachers.router, prefix="/teachers", tags=["teachers"])
 app.include_router(courses.router, prefix="/courses", tags=["courses"])
 app.include_router(sections.router, prefix="/sections", tags=["sections"])
 app.include_router(enrollments.router, prefix="/enrollments", tags=["enrollments"])
+app.include_router(terms.router, prefix="/terms", tags=["terms"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+app.include_router(profiles.router, prefix="/profiles", tags=["profiles"])
+
+# No-op unless app.profiling.PROFILING_ENABLED is set
+install_profiling(app)
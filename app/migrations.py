@@ -0,0 +1,363 @@
+"""Versioned schema migrations.
+
+Workers only compare the stored schema version at startup; migrations are
+applied out of band with::
+
+	python -m app.migrations upgrade [--tenant NAME | --all-tenants]
+
+Every change to the tables in ``app.models`` needs a new entry appended to
+``MIGRATIONS``. Applied migrations must never be edited.
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Sequence, Union
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+SCHEMA_VERSION_TABLE = "schema_version"
+
+Step = Union[str, Callable[[Connection], None]]
+
+
+class Migration(NamedTuple):
+	version: int
+	description: str
+	steps: Sequence[Step]
+
+
+class SchemaOutOfDateError(RuntimeError):
+	pass
+
+
+# Grade points in tenths, frozen copy of app.gpa.GRADE_POINTS as of migrations 6 and 11
+_V6_GRADE_POINTS = """CASE UPPER(TRIM(grade))
+	WHEN 'A+' THEN 40 WHEN 'A' THEN 40 WHEN 'A-' THEN 37
+	WHEN 'B+' THEN 33 WHEN 'B' THEN 30 WHEN 'B-' THEN 27
+	WHEN 'C+' THEN 23 WHEN 'C' THEN 20 WHEN 'C-' THEN 17
+	WHEN 'D+' THEN 13 WHEN 'D' THEN 10 WHEN 'D-' THEN 7
+	WHEN 'F' THEN 0
+END"""
+
+MIGRATIONS: List[Migration] = [
+	Migration(1, "baseline schema", [
+		"""CREATE TABLE IF NOT EXISTS course (
+			title VARCHAR NOT NULL,
+			description VARCHAR,
+			id INTEGER NOT NULL,
+			PRIMARY KEY (id)
+		)""",
+		"""CREATE TABLE IF NOT EXISTS student (
+			first_name VARCHAR NOT NULL,
+			last_name VARCHAR NOT NULL,
+			email VARCHAR NOT NULL,
+			id INTEGER NOT NULL,
+			password_hash VARCHAR,
+			PRIMARY KEY (id)
+		)""",
+		"""CREATE TABLE IF NOT EXISTS teacher (
+			first_name VARCHAR NOT NULL,
+			last_name VARCHAR NOT NULL,
+			email VARCHAR NOT NULL,
+			subject VARCHAR(15) NOT NULL,
+			id INTEGER NOT NULL,
+			password_hash VARCHAR,
+			PRIMARY KEY (id)
+		)""",
+		"""CREATE TABLE IF NOT EXISTS section (
+			name VARCHAR NOT NULL,
+			capacity INTEGER,
+			id INTEGER NOT NULL,
+			course_id INTEGER NOT NULL,
+			teacher_id INTEGER NOT NULL,
+			PRIMARY KEY (id),
+			FOREIGN KEY(course_id) REFERENCES course (id),
+			FOREIGN KEY(teacher_id) REFERENCES teacher (id)
+		)""",
+		"""CREATE TABLE IF NOT EXISTS enrollment (
+			id INTEGER NOT NULL,
+			student_id INTEGER NOT NULL,
+			section_id INTEGER NOT NULL,
+			grade VARCHAR,
+			PRIMARY KEY (id),
+			FOREIGN KEY(student_id) REFERENCES student (id),
+			FOREIGN KEY(section_id) REFERENCES section (id)
+		)""",
+	]),
+	Migration(2, "background job table", [
+		"""CREATE TABLE job (
+			id INTEGER NOT NULL,
+			kind VARCHAR NOT NULL,
+			status VARCHAR(9) NOT NULL,
+			params VARCHAR,
+			result VARCHAR,
+			error VARCHAR,
+			total INTEGER NOT NULL,
+			progress INTEGER NOT NULL,
+			cancel_requested BOOLEAN NOT NULL,
+			created_at DATETIME NOT NULL,
+			started_at DATETIME,
+			finished_at DATETIME,
+			PRIMARY KEY (id)
+		)""",
+	]),
+	Migration(3, "indexes for roster, transcript and teacher section lookups", [
+		"CREATE INDEX IF NOT EXISTS ix_section_course_id ON section (course_id)",
+		"CREATE INDEX IF NOT EXISTS ix_section_teacher_id ON section (teacher_id)",
+		"CREATE INDEX IF NOT EXISTS ix_enrollment_section_id ON enrollment (section_id)",
+		"CREATE INDEX IF NOT EXISTS ix_enrollment_student_section ON enrollment (student_id, section_id)",
+	]),
+	Migration(4, "terms and enrollment archive", [
+		"""CREATE TABLE term (
+			name VARCHAR NOT NULL,
+			id INTEGER NOT NULL,
+			is_active BOOLEAN NOT NULL,
+			closed_at DATETIME,
+			archived_at DATETIME,
+			PRIMARY KEY (id)
+		)""",
+		# Existing sections and enrollments all belong to this first term
+		"INSERT INTO term (id, name, is_active) VALUES (1, 'Current', 1)",
+		"ALTER TABLE section ADD COLUMN term_id INTEGER NOT NULL DEFAULT 1 REFERENCES term (id)",
+		"ALTER TABLE enrollment ADD COLUMN term_id INTEGER NOT NULL DEFAULT 1 REFERENCES term (id)",
+		"CREATE INDEX ix_section_term_id ON section (term_id)",
+		"CREATE INDEX ix_enrollment_term_id ON enrollment (term_id)",
+		"""CREATE TABLE enrollment_archive (
+			id INTEGER NOT NULL,
+			enrollment_id INTEGER NOT NULL,
+			student_id INTEGER NOT NULL,
+			section_id INTEGER NOT NULL,
+			term_id INTEGER NOT NULL,
+			grade VARCHAR,
+			PRIMARY KEY (id),
+			FOREIGN KEY(student_id) REFERENCES student (id),
+			FOREIGN KEY(section_id) REFERENCES section (id),
+			FOREIGN KEY(term_id) REFERENCES term (id)
+		)""",
+		"CREATE INDEX ix_enrollment_archive_student_id ON enrollment_archive (student_id)",
+		"CREATE INDEX ix_enrollment_archive_section_id ON enrollment_archive (section_id)",
+		"CREATE INDEX ix_enrollment_archive_term_id ON enrollment_archive (term_id)",
+	]),
+	Migration(5, "section enrolled_count", [
+		"ALTER TABLE section ADD COLUMN enrolled_count INTEGER NOT NULL DEFAULT 0",
+		# Archived enrollments still took a seat in their section
+		"""UPDATE section SET enrolled_count =
+			(SELECT COUNT(*) FROM enrollment WHERE enrollment.section_id = section.id)
+			+ (SELECT COUNT(*) FROM enrollment_archive WHERE enrollment_archive.section_id = section.id)""",
+	]),
+	Migration(6, "student_gpa aggregate", [
+		"""CREATE TABLE student_gpa (
+			student_id INTEGER NOT NULL,
+			points_tenths INTEGER NOT NULL,
+			graded_count INTEGER NOT NULL,
+			gpa FLOAT,
+			PRIMARY KEY (student_id),
+			FOREIGN KEY(student_id) REFERENCES student (id)
+		)""",
+		"""INSERT INTO student_gpa (student_id, points_tenths, graded_count, gpa)
+			SELECT student_id, SUM(points), COUNT(*), SUM(points) / (10.0 * COUNT(*)) FROM (
+				SELECT student_id, {points} AS points FROM enrollment
+				UNION ALL
+				SELECT student_id, {points} AS points FROM enrollment_archive
+			) WHERE points IS NOT NULL GROUP BY student_id""".format(points=_V6_GRADE_POINTS),
+	]),
+	Migration(7, "encrypted job secrets", [
+		"ALTER TABLE job ADD COLUMN secret VARCHAR",
+		# Earlier password reset jobs kept the temporary passwords in plaintext
+		"UPDATE job SET result = NULL WHERE kind = 'password_reset'",
+	]),
+	# Archiving empties enrollment, after which SQLite would hand out the
+	# archived ids again; AUTOINCREMENT ids only ever grow
+	Migration(8, "monotonic enrollment ids", [
+		"""CREATE TABLE enrollment_new (
+			id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+			student_id INTEGER NOT NULL,
+			section_id INTEGER NOT NULL,
+			term_id INTEGER NOT NULL,
+			grade VARCHAR,
+			FOREIGN KEY(student_id) REFERENCES student (id),
+			FOREIGN KEY(section_id) REFERENCES section (id),
+			FOREIGN KEY(term_id) REFERENCES term (id)
+		)""",
+		"""INSERT INTO enrollment_new (id, student_id, section_id, term_id, grade)
+			SELECT id, student_id, section_id, term_id, grade FROM enrollment""",
+		"DROP TABLE enrollment",
+		"ALTER TABLE enrollment_new RENAME TO enrollment",
+		"CREATE INDEX ix_enrollment_section_id ON enrollment (section_id)",
+		"CREATE INDEX ix_enrollment_student_section ON enrollment (student_id, section_id)",
+		"CREATE INDEX ix_enrollment_term_id ON enrollment (term_id)",
+		# Start past every id already handed out, archived ones included
+		"""INSERT INTO sqlite_sequence (name, seq)
+			SELECT 'enrollment', 0
+			WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'enrollment')""",
+		"""UPDATE sqlite_sequence SET seq = MAX(
+			seq,
+			(SELECT COALESCE(MAX(id), 0) FROM enrollment),
+			(SELECT COALESCE(MAX(enrollment_id), 0) FROM enrollment_archive)
+		) WHERE name = 'enrollment'""",
+	]),
+	Migration(9, "job owner and heartbeat", [
+		"ALTER TABLE job ADD COLUMN owner VARCHAR",
+		"ALTER TABLE job ADD COLUMN heartbeat_at DATETIME",
+	]),
+	Migration(10, "idempotency keys", [
+		"""CREATE TABLE idempotency_key (
+			key VARCHAR NOT NULL,
+			fingerprint VARCHAR NOT NULL,
+			created_at DATETIME NOT NULL,
+			completed_at DATETIME,
+			status_code INTEGER,
+			headers VARCHAR,
+			body BLOB,
+			PRIMARY KEY (key)
+		)""",
+		"CREATE INDEX ix_idempotency_key_created_at ON idempotency_key (created_at)",
+	]),
+	# The duplicate check in enroll_student raced; concurrent enrolls could
+	# insert the same pair twice and bump enrolled_count twice for one seat
+	Migration(11, "unique student and section per enrollment", [
+		# Keep one row per pair, a graded one if there is one
+		"""DELETE FROM enrollment WHERE id NOT IN (
+			SELECT id FROM (
+				SELECT id, ROW_NUMBER() OVER (
+					PARTITION BY student_id, section_id ORDER BY grade IS NULL, id
+				) AS position FROM enrollment
+			) WHERE position = 1
+		)""",
+		"DROP INDEX ix_enrollment_student_section",
+		"CREATE UNIQUE INDEX ix_enrollment_student_section ON enrollment (student_id, section_id)",
+		# Recount the aggregates the removed duplicates had inflated
+		"""UPDATE section SET enrolled_count =
+			(SELECT COUNT(*) FROM enrollment WHERE enrollment.section_id = section.id)
+			+ (SELECT COUNT(*) FROM enrollment_archive WHERE enrollment_archive.section_id = section.id)""",
+		"DELETE FROM student_gpa",
+		"""INSERT INTO student_gpa (student_id, points_tenths, graded_count, gpa)
+			SELECT student_id, SUM(points), COUNT(*), SUM(points) / (10.0 * COUNT(*)) FROM (
+				SELECT student_id, {points} AS points FROM enrollment
+				UNION ALL
+				SELECT student_id, {points} AS points FROM enrollment_archive
+			) WHERE points IS NOT NULL GROUP BY student_id""".format(points=_V6_GRADE_POINTS),
+	]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(engine: Engine) -> int:
+	try:
+		with engine.connect() as conn:
+			version = conn.execute(
+				text(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")
+			).scalar()
+	except DBAPIError:
+		# No version table yet: nothing has been migrated
+		return 0
+	return version or 0
+
+
+def ensure_current(engine: Engine) -> None:
+	"""Cheap startup check; raises if the database needs migrating."""
+	version = current_version(engine)
+	if version != LATEST_VERSION:
+		raise SchemaOutOfDateError(
+			f"Database schema is at version {version}, expected {LATEST_VERSION}; "
+			"run `python -m app.migrations upgrade`"
+		)
+
+
+def _transactional_engine(engine: Engine) -> Engine:
+	"""A private engine whose ``begin()`` really wraps DDL in a transaction.
+
+	pysqlite only emits BEGIN before DML, so DDL steps would otherwise
+	autocommit one by one and a failed migration could leave half its
+	tables behind with the version unchanged. This is SQLAlchemy's
+	documented pysqlite recipe: disable the driver's transaction handling
+	and issue BEGIN ourselves.
+	"""
+	if engine.dialect.name != "sqlite":
+		return engine
+	migrating = create_engine(engine.url, connect_args={"check_same_thread": False})
+
+	@event.listens_for(migrating, "connect")
+	def _no_driver_transactions(dbapi_connection, connection_record) -> None:  # type: ignore[no-untyped-def]
+		dbapi_connection.isolation_level = None
+
+	@event.listens_for(migrating, "begin")
+	def _begin(conn: Connection) -> None:
+		conn.exec_driver_sql("BEGIN")
+
+	return migrating
+
+
+def upgrade(engine: Engine) -> List[int]:
+	"""Apply pending migrations in order and return the versions applied.
+
+	Each migration's steps and its version row commit or roll back together.
+	"""
+	migrating = _transactional_engine(engine)
+	try:
+		return _apply_pending(migrating)
+	finally:
+		if migrating is not engine:
+			migrating.dispose()
+
+
+def _apply_pending(engine: Engine) -> List[int]:
+	with engine.begin() as conn:
+		conn.execute(text(
+			f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} ("
+			"version INTEGER NOT NULL PRIMARY KEY, "
+			"description VARCHAR NOT NULL, "
+			"applied_at VARCHAR NOT NULL)"
+		))
+	applied: List[int] = []
+	start = current_version(engine)
+	for migration in MIGRATIONS:
+		if migration.version <= start:
+			continue
+		with engine.begin() as conn:
+			for step in migration.steps:
+				if callable(step):
+					step(conn)
+				else:
+					conn.exec_driver_sql(step)
+			conn.execute(
+				text(
+					f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) "
+					"VALUES (:version, :description, :applied_at)"
+				),
+				{
+					"version": migration.version,
+					"description": migration.description,
+					"applied_at": datetime.now(timezone.utc).isoformat(),
+				},
+			)
+		applied.append(migration.version)
+	return applied
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+	from .database import DEFAULT_TENANT, get_engine, known_tenants
+
+	parser = argparse.ArgumentParser(prog="python -m app.migrations")
+	parser.add_argument("command", choices=["status", "upgrade"])
+	target = parser.add_mutually_exclusive_group()
+	target.add_argument("--tenant", default=DEFAULT_TENANT)
+	target.add_argument("--all-tenants", action="store_true")
+	args = parser.parse_args(argv)
+
+	tenants = known_tenants() if args.all_tenants else [args.tenant]
+	for tenant in tenants:
+		engine = get_engine(tenant)
+		if args.command == "upgrade":
+			applied = upgrade(engine)
+			print(f"{tenant}: applied {applied or 'nothing'}, now at version {current_version(engine)}")
+		else:
+			print(f"{tenant}: version {current_version(engine)} of {LATEST_VERSION}")
+
+
+if __name__ == "__main__":
+	main()
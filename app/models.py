@@ -1,7 +1,9 @@
 from __future__ import annotations
 
-from typing import Optional, List
+from datetime import datetime, timezone
+from typing import Any, Optional, List
 from enum import Enum
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -96,6 +98,30 @@ class CourseUpdate(SQLModel):
 	description: Optional[str] = None
 
 
+class TermBase(SQLModel):
+	name: str
+
+
+class Term(TermBase, table=True):
+	"""An academic term. Queries default to the single active term; once a
+	term is closed its enrollments can be moved to ``enrollment_archive``."""
+	id: Optional[int] = Field(default=None, primary_key=True)
+	is_active: bool = False
+	closed_at: Optional[datetime] = None
+	archived_at: Optional[datetime] = None
+
+
+class TermRead(TermBase):
+	id: int
+	is_active: bool
+	closed_at: Optional[datetime] = None
+	archived_at: Optional[datetime] = None
+
+
+class TermCreate(TermBase):
+	pass
+
+
 class SectionBase(SQLModel):
 	name: str
 	capacity: Optional[int] = None
@@ -103,28 +129,116 @@ class SectionBase(SQLModel):
 
 class Section(SectionBase, table=True):
 	id: Optional[int] = Field(default=None, primary_key=True)
-	course_id: int = Field(foreign_key="course.id")
-	teacher_id: int = Field(foreign_key="teacher.id")
+	course_id: int = Field(foreign_key="course.id", index=True)
+	teacher_id: int = Field(foreign_key="teacher.id", index=True)
+	term_id: int = Field(foreign_key="term.id", index=True)
+	# Maintained on enroll/unenroll so the catalog never counts rosters
+	enrolled_count: int = 0
 
 
 class SectionRead(SectionBase):
 	id: int
 	course_id: int
 	teacher_id: int
+	term_id: int
 
 
 class SectionCreate(SectionBase):
 	course_id: int
 	teacher_id: int
+	term_id: Optional[int] = None  # defaults to the active term
+
+
+class SectionExpanded(SectionRead):
+	"""Section with the relationships requested through ``expand=``"""
+	course: Optional[CourseRead] = None
+	teacher: Optional[TeacherRead] = None
+	students: Optional[List[StudentRead]] = None
+
+
+class SectionUpdate(SQLModel):
+	"""Sections cannot move between terms: their enrollments are tied to the term"""
+	name: Optional[str] = None
+	capacity: Optional[int] = None
+	course_id: Optional[int] = None
+	teacher_id: Optional[int] = None
+
+
+class SectionCatalogEntry(SQLModel):
+	"""A section with its open seats; ``seats_remaining`` is None when capacity is unlimited"""
+	id: int
+	name: str
+	course_id: int
+	course_title: str
+	teacher_id: int
+	teacher_name: str
+	subject: Subject
+	capacity: Optional[int] = None
+	enrolled_count: int
+	seats_remaining: Optional[int] = None
+
+
+class TeacherWithSections(TeacherRead):
+	sections: Optional[List[SectionRead]] = None
 
 
 class Enrollment(SQLModel, table=True):
+	# (student_id, section_id) serves transcripts and the duplicate check.
+	# AUTOINCREMENT keeps ids from being reused once rows move to the archive.
+	__table_args__ = (
+		Index("ix_enrollment_student_section", "student_id", "section_id", unique=True),
+		{"sqlite_autoincrement": True},
+	)
+
 	id: Optional[int] = Field(default=None, primary_key=True)
 	student_id: int = Field(foreign_key="student.id")
-	section_id: int = Field(foreign_key="section.id")
+	section_id: int = Field(foreign_key="section.id", index=True)
+	# Copied from the section so term filters and archival need no join
+	term_id: int = Field(foreign_key="term.id", index=True)
+	grade: Optional[str] = None
+
+
+class EnrollmentArchive(SQLModel, table=True):
+	"""Enrollments of archived terms, moved out of the hot ``enrollment`` table.
+
+	Rows get their own primary key: SQLite may hand out an archived
+	enrollment's id again once it has left ``enrollment``.
+	"""
+	__tablename__ = "enrollment_archive"
+
+	id: Optional[int] = Field(default=None, primary_key=True)
+	enrollment_id: int
+	student_id: int = Field(foreign_key="student.id", index=True)
+	section_id: int = Field(foreign_key="section.id", index=True)
+	term_id: int = Field(foreign_key="term.id", index=True)
 	grade: Optional[str] = None
 
 
+class StudentGpa(SQLModel, table=True):
+	"""Materialized per-student GPA, maintained incrementally by app.gpa"""
+	__tablename__ = "student_gpa"
+
+	student_id: int = Field(foreign_key="student.id", primary_key=True)
+	# Sum of grade points in tenths (A = 40) over graded enrollments
+	points_tenths: int = 0
+	graded_count: int = 0
+	gpa: Optional[float] = None
+
+
+class StudentGpaRead(SQLModel):
+	student_id: int
+	gpa: Optional[float] = None
+	graded_count: int
+	rank: Optional[int] = None
+	ranked_students: int
+
+
+class StudentRank(SQLModel):
+	rank: int
+	student_id: int
+	gpa: float
+
+
 class StudentClassWithGrade(SQLModel):
 	course_title: str
 	section_name: str
@@ -144,6 +258,111 @@ class StudentInSection(SQLModel):
 	grade: Optional[str] = None
 
 
+# Upper bound on IDs per batch lookup request
+MAX_BATCH_IDS = 5000
+
+
+class BatchGet(SQLModel):
+	ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_IDS)
+
+
+class StudentBatch(SQLModel):
+	items: List[StudentRead]
+	missing: List[int]
+
+
+class TeacherBatch(SQLModel):
+	items: List[TeacherRead]
+	missing: List[int]
+
+
+class CourseBatch(SQLModel):
+	items: List[CourseRead]
+	missing: List[int]
+
+
+class SectionBatch(SQLModel):
+	items: List[SectionRead]
+	missing: List[int]
+
+
+class EnrollmentBatch(SQLModel):
+	items: List[Enrollment]
+	missing: List[int]
+
+
+class JobStatus(str, Enum):
+	QUEUED = "queued"
+	RUNNING = "running"
+	SUCCEEDED = "succeeded"
+	FAILED = "failed"
+	CANCELLED = "cancelled"
+
+
+class Job(SQLModel, table=True):
+	"""A long-running operation executed off the request path by app.jobs"""
+	id: Optional[int] = Field(default=None, primary_key=True)
+	kind: str
+	status: JobStatus = JobStatus.QUEUED
+	params: Optional[str] = None  # JSON
+	result: Optional[str] = None  # JSON
+	# Encrypted JSON (e.g. temporary passwords), cleared by the first result read
+	secret: Optional[str] = None
+	error: Optional[str] = None
+	total: int = 0
+	progress: int = 0
+	cancel_requested: bool = False
+	created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+	started_at: Optional[datetime] = None
+	finished_at: Optional[datetime] = None
+	# The process that accepted the job, and when it last showed it is alive
+	owner: Optional[str] = None
+	heartbeat_at: Optional[datetime] = None
+
+
+class JobRead(SQLModel):
+	id: int
+	kind: str
+	status: JobStatus
+	error: Optional[str] = None
+	total: int
+	progress: int
+	cancel_requested: bool
+	created_at: datetime
+	started_at: Optional[datetime] = None
+	finished_at: Optional[datetime] = None
+
+
+class JobResult(SQLModel):
+	id: int
+	status: JobStatus
+	result: Optional[Any] = None
+	# Only in the first response after the job finishes, and only within the retention window
+	secret: Optional[Any] = None
+
+
+class PasswordResetJobCreate(SQLModel):
+	"""Exactly one of student_ids, section_id or all selects the students"""
+	student_ids: Optional[List[int]] = None
+	section_id: Optional[int] = None
+	all: bool = False
+
+
 class Token(SQLModel):
 	access_token: str
 	token_type: str = "bearer"
+
+
+class IdempotencyKey(SQLModel, table=True):
+	"""A claimed ``Idempotency-Key`` and, once the request finished, its response"""
+	__tablename__ = "idempotency_key"
+
+	# sha256 of the key and the request's scope, see app.idempotency
+	key: str = Field(primary_key=True)
+	fingerprint: str
+	created_at: datetime = Field(index=True)
+	# Null while the first attempt is still running
+	completed_at: Optional[datetime] = None
+	status_code: Optional[int] = None
+	headers: Optional[str] = None  # JSON list of [name, value]
+	body: Optional[bytes] = None
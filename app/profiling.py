@@ -0,0 +1,155 @@
+"""Opt-in request profiling.
+
+When ``PROFILING_ENABLED`` is set, :func:`install` adds a middleware that
+profiles a request if an admin sends ``X-Profile: 1`` or it is picked by
+``PROFILE_SAMPLE_RATE``. A profile holds the cProfile stats of the endpoint
+function plus every SQL statement the request ran with its timing. The last
+``MAX_STORED_PROFILES`` are kept in memory and served by the profiles router.
+
+When profiling is disabled nothing is installed, so requests pay no overhead.
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .security import is_admin_key
+
+PROFILING_ENABLED = False
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_HEADER = "X-Profile"
+ADMIN_KEY_HEADER = "X-Admin-Key"
+MAX_STORED_PROFILES = 20
+PROFILE_STATS_LINES = 40
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+_profiles: Deque[Dict[str, Any]] = deque(maxlen=MAX_STORED_PROFILES)
+_ids = itertools.count(1)
+# Only one cProfile profiler can run at a time on newer Pythons
+_cprofile_lock = threading.Lock()
+
+
+class RequestProfile:
+	def __init__(self, method: str, path: str) -> None:
+		self.method = method
+		self.path = path
+		self.started_at = datetime.now(timezone.utc)
+		self.sql: List[Dict[str, Any]] = []
+		self.stats: Optional[str] = None
+
+	def run(self, call: Callable[..., Any], **values: Any) -> Any:
+		if not _cprofile_lock.acquire(blocking=False):
+			# Another request is being profiled; keep the SQL timings only
+			return call(**values)
+		profiler = cProfile.Profile()
+		try:
+			profiler.enable()
+			try:
+				return call(**values)
+			finally:
+				profiler.disable()
+		finally:
+			_cprofile_lock.release()
+			out = io.StringIO()
+			pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_STATS_LINES)
+			self.stats = out.getvalue()
+
+
+def stored_profiles() -> List[Dict[str, Any]]:
+	return list(_profiles)
+
+
+def _should_profile(request: Request) -> bool:
+	if request.headers.get(PROFILE_HEADER) == "1":
+		return is_admin_key(request.headers.get(ADMIN_KEY_HEADER))
+	return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # type: ignore[no-untyped-def]
+	if _current.get() is not None:
+		conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # type: ignore[no-untyped-def]
+	profile = _current.get()
+	if profile is None:
+		return
+	starts = conn.info.get("profile_query_start")
+	if not starts:
+		return
+	profile.sql.append({
+		"statement": statement,
+		"parameters": repr(parameters),
+		"duration_ms": round((time.perf_counter() - starts.pop()) * 1000, 3),
+	})
+
+
+def _profiled(call: Callable[..., Any]) -> Callable[..., Any]:
+	@functools.wraps(call)
+	def wrapper(**values: Any) -> Any:
+		profile = _current.get()
+		if profile is None:
+			return call(**values)
+		return profile.run(call, **values)
+	return wrapper
+
+
+def install(app: FastAPI) -> None:
+	"""Hook profiling into ``app``; a no-op unless PROFILING_ENABLED is set.
+
+	Call after all routers are included.
+	"""
+	if not PROFILING_ENABLED:
+		return
+
+	event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+	event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+	for route in app.routes:
+		# Endpoints here are all sync; they run in the threadpool, so the
+		# profiler has to be started inside the endpoint's own thread
+		if isinstance(route, APIRoute) and not asyncio.iscoroutinefunction(route.dependant.call):
+			if not getattr(route.dependant, "_profiled", False):
+				route.dependant.call = _profiled(route.dependant.call)
+				route.dependant._profiled = True  # type: ignore[attr-defined]
+
+	@app.middleware("http")
+	async def profile_requests(request: Request, call_next):  # type: ignore[no-untyped-def]
+		if not _should_profile(request):
+			return await call_next(request)
+		profile = RequestProfile(request.method, request.url.path)
+		token = _current.set(profile)
+		start = time.perf_counter()
+		try:
+			response = await call_next(request)
+		finally:
+			_current.reset(token)
+		_profiles.append({
+			"id": next(_ids),
+			"method": profile.method,
+			"path": profile.path,
+			"status_code": response.status_code,
+			"started_at": profile.started_at.isoformat(),
+			"duration_ms": round((time.perf_counter() - start) * 1000, 3),
+			"sql_count": len(profile.sql),
+			"sql_ms": round(sum(q["duration_ms"] for q in profile.sql), 3),
+			"sql": profile.sql,
+			"stats": profile.stats,
+		})
+		return response
@@ -0,0 +1,82 @@
+"""Sparse fieldsets (``?fields=a,b,c``) pushed down into the SQL SELECT."""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, TypeAdapter, create_model
+from sqlmodel import Session, SQLModel, select
+
+
+def parse_fields(fields: Optional[str], read_model: Type[SQLModel]) -> Tuple[str, ...]:
+	"""Validate a ``fields`` parameter against a read model.
+
+	Returns the requested fields in model order, always including ``id``.
+	Without a ``fields`` parameter every field of the read model is selected.
+	"""
+	available = list(read_model.model_fields)
+	if not fields:
+		return tuple(available)
+	requested = {f.strip() for f in fields.split(",") if f.strip()}
+	unknown = requested - set(available)
+	if unknown:
+		raise HTTPException(
+			status_code=400,
+			detail=f"Unknown field(s): {', '.join(sorted(unknown))}",
+		)
+	requested.add("id")
+	return tuple(f for f in available if f in requested)
+
+
+@lru_cache(maxsize=256)
+def projection_model(read_model: Type[SQLModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+	"""Build (and cache) a response model holding only ``fields``."""
+	definitions: Dict[str, Any] = {
+		name: (read_model.model_fields[name].annotation, ...) for name in fields
+	}
+	return create_model(f"{read_model.__name__}Fields", **definitions)
+
+
+@lru_cache(maxsize=256)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+	return TypeAdapter(List[model])  # type: ignore[valid-type]
+
+
+def select_fields(
+	session: Session,
+	table_model: Type[SQLModel],
+	fields: Tuple[str, ...],
+	*where: Any,
+) -> List[Dict[str, Any]]:
+	"""SELECT only the columns for ``fields`` and return them as dicts."""
+	query = select(*[getattr(table_model, name) for name in fields])
+	for clause in where:
+		query = query.where(clause)
+	rows = session.exec(query).all()
+	if len(fields) == 1:
+		# A single-column select yields scalars rather than rows
+		rows = [(value,) for value in rows]
+	return [dict(zip(fields, row)) for row in rows]
+
+
+def fields_response(
+	read_model: Type[SQLModel],
+	fields: Tuple[str, ...],
+	rows: Sequence[Dict[str, Any]],
+) -> Response:
+	model = projection_model(read_model, fields)
+	items = [model.model_construct(**row) for row in rows]
+	return Response(content=_list_adapter(model).dump_json(items), media_type="application/json")
+
+
+def field_response(
+	read_model: Type[SQLModel],
+	fields: Tuple[str, ...],
+	row: Dict[str, Any],
+) -> Response:
+	model = projection_model(read_model, fields)
+	return Response(
+		content=model.model_construct(**row).model_dump_json(),
+		media_type="application/json",
+	)
@@ -0,0 +1,205 @@
+"""Query-plan guardrails for the hot endpoints.
+
+Builds a throwaway seeded SQLite database, runs each hot endpoint function
+against it while capturing the SQL it emits, and runs ``EXPLAIN QUERY PLAN``
+on every statement. A check fails when a plan scans one of ``LARGE_TABLES``
+instead of searching an index, so a router change that silently brings back
+a full scan of ``enrollment`` is caught before it ships::
+
+	python -m app.query_plans
+"""
+from __future__ import annotations
+
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi import HTTPException, Request
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, create_engine, select
+
+from .migrations import upgrade
+from .models import Enrollment, StudentLogin, Teacher, TeacherLogin
+from .routers.auth import student_login, teacher_login
+from .routers.enrollments import enroll_student, list_section_students
+from .routers.sections import section_catalog
+from .routers.students import get_student_classes_with_grades
+from .routers.teachers import get_my_sections
+from .security import get_password_hash
+
+# Tables that grow with the school; scanning them on a hot path is a regression
+LARGE_TABLES = {"enrollment", "student", "section"}
+
+SEED_STUDENTS = 2000
+SEED_TEACHERS = 50
+SEED_SECTIONS_PER_TEACHER = 4
+SEED_ENROLLMENTS_PER_STUDENT = 4
+
+_SCAN_RE = re.compile(r"\bSCAN (?:TABLE )?(\w+)")
+
+
+def _seed(engine: Engine) -> None:
+	password_hash = get_password_hash("guardrail")
+	sections = SEED_TEACHERS * SEED_SECTIONS_PER_TEACHER
+	with engine.begin() as conn:
+		conn.execute(text("INSERT INTO course (id, title) VALUES (1, 'Math')"))
+		conn.execute(
+			text(
+				"INSERT INTO teacher (id, first_name, last_name, email, subject, password_hash) "
+				"VALUES (:id, 'T', 'Teacher', :email, 'MATH', :password_hash)"
+			),
+			[
+				{"id": i, "email": f"t{i}@school.edu", "password_hash": password_hash}
+				for i in range(1, SEED_TEACHERS + 1)
+			],
+		)
+		conn.execute(
+			text(
+				"INSERT INTO section (id, name, capacity, course_id, teacher_id, term_id) "
+				"VALUES (:id, :name, 30, 1, :teacher_id, 1)"
+			),
+			[
+				{"id": i, "name": f"Sec {i}", "teacher_id": (i - 1) // SEED_SECTIONS_PER_TEACHER + 1}
+				for i in range(1, sections + 1)
+			],
+		)
+		conn.execute(
+			text(
+				"INSERT INTO student (id, first_name, last_name, email, password_hash) "
+				"VALUES (:id, 'S', 'Student', :email, :password_hash)"
+			),
+			[
+				{"id": i, "email": f"s{i}@example.com", "password_hash": password_hash}
+				for i in range(1, SEED_STUDENTS + 1)
+			],
+		)
+		conn.execute(
+			text(
+				"INSERT INTO enrollment (student_id, section_id, term_id, grade) "
+				"VALUES (:student_id, :section_id, 1, 'A')"
+			),
+			[
+				{"student_id": s, "section_id": (s * 7 + k * 13) % sections + 1}
+				for s in range(1, SEED_STUDENTS + 1)
+				for k in range(SEED_ENROLLMENTS_PER_STUDENT)
+			],
+		)
+		conn.execute(text("ANALYZE"))
+
+
+def _fake_request() -> Request:
+	return Request({"type": "http", "method": "POST", "headers": [], "client": ("127.0.0.1", 0)})
+
+
+def _section_roster(session: Session) -> None:
+	list_section_students(section_id=1, session=session)
+
+
+def _section_catalog(session: Session) -> None:
+	section_catalog(only_open=True, session=session)
+
+
+def _student_transcript(session: Session) -> None:
+	get_student_classes_with_grades(student_id=1, session=session)
+
+
+def _teacher_sections(session: Session) -> None:
+	teacher = session.get(Teacher, 1)
+	session.expire_all()
+	get_my_sections(current_teacher=teacher, session=session)  # type: ignore[arg-type]
+
+
+def _enrollment_duplicate_check(session: Session) -> None:
+	existing = session.exec(select(Enrollment).where(Enrollment.id == 1)).one()
+	session.expire_all()
+	try:
+		enroll_student(student_id=existing.student_id, section_id=existing.section_id, session=session)
+	except HTTPException:
+		pass  # expected: already enrolled
+
+
+def _student_login(session: Session) -> None:
+	try:
+		student_login(StudentLogin(student_id=1, password="wrong"), _fake_request(), session, "guardrail")
+	except HTTPException:
+		pass
+
+
+def _teacher_login(session: Session) -> None:
+	try:
+		teacher_login(TeacherLogin(teacher_id=1, password="wrong"), _fake_request(), session, "guardrail")
+	except HTTPException:
+		pass
+
+
+HOT_QUERIES: Dict[str, Callable[[Session], None]] = {
+	"section roster": _section_roster,
+	"section catalog": _section_catalog,
+	"student transcript": _student_transcript,
+	"teacher sections": _teacher_sections,
+	"enrollment duplicate check": _enrollment_duplicate_check,
+	"student login": _student_login,
+	"teacher login": _teacher_login,
+}
+
+
+def _capture(engine: Engine, fn: Callable[[Session], None]) -> List[Tuple[str, Any]]:
+	statements: List[Tuple[str, Any]] = []
+
+	def record(conn, cursor, statement, parameters, context, executemany) -> None:  # type: ignore[no-untyped-def]
+		if statement.lstrip().upper().startswith("SELECT"):
+			statements.append((statement, parameters))
+
+	with Session(engine) as session:
+		event.listen(engine, "before_cursor_execute", record)
+		try:
+			fn(session)
+		finally:
+			event.remove(engine, "before_cursor_execute", record)
+	return statements
+
+
+def check_query_plans() -> List[str]:
+	"""Run every hot query and return a description of each plan regression"""
+	failures: List[str] = []
+	with tempfile.TemporaryDirectory() as tmp:
+		engine = create_engine(f"sqlite:///{Path(tmp) / 'guardrail.db'}")
+		try:
+			upgrade(engine)
+			_seed(engine)
+			for name, fn in HOT_QUERIES.items():
+				statements = _capture(engine, fn)
+				if not statements:
+					failures.append(f"{name}: captured no SQL")
+				with engine.connect() as conn:
+					for statement, parameters in statements:
+						plan = [
+							row[-1]
+							for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+						]
+						scanned = [t for line in plan for t in _SCAN_RE.findall(line) if t in LARGE_TABLES]
+						if scanned:
+							failures.append(
+								f"{name}: full scan of {', '.join(scanned)}\n"
+								f"  SQL: {' '.join(statement.split())}\n"
+								f"  plan: {'; '.join(plan)}"
+							)
+		finally:
+			engine.dispose()
+	return failures
+
+
+def main() -> None:
+	failures = check_query_plans()
+	for failure in failures:
+		print(f"FAIL {failure}")
+	if failures:
+		sys.exit(1)
+	print(f"OK: {len(HOT_QUERIES)} hot queries use index searches")
+
+
+if __name__ == "__main__":
+	main()
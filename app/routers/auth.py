@@ -2,20 +2,20 @@ from __future__ import annotations
 
 from datetime import timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
 from sqlmodel import Session
 
-from ..database import get_session
+from ..database import get_read_session, get_tenant
 from ..models import Student, StudentLogin, Teacher, TeacherLogin, Token
 from ..security import (
-	ALGORITHM,
-	SECRET_KEY,
+	InvalidTokenError,
 	create_access_token,
-	get_password_hash,
+	decode_access_token,
+	is_admin_key,
 	verify_password,
 )
+from ..throttle import admit_login, remember_unknown, verify_slot
 
 
 router = APIRouter()
@@ -24,16 +24,24 @@ security = HTTPBearer()
 
 @router.post("/login", response_model=Token)
 def student_login(
-	payload: StudentLogin, session: Session = Depends(get_session)
+	payload: StudentLogin,
+	request: Request,
+	session: Session = Depends(get_read_session),
+	tenant: str = Depends(get_tenant),
 ) -> Token:
+	admit_login(request, tenant, "student", payload.student_id)
 	student = session.get(Student, payload.student_id)
 	if not student or not student.password_hash:
+		if not student:
+			remember_unknown(tenant, "student", payload.student_id)
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED,
 			detail="Invalid credentials",
 		)
 
-	if not verify_password(payload.password, student.password_hash):
+	with verify_slot():
+		valid = verify_password(payload.password, student.password_hash)
+	if not valid:
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED,
 			detail="Invalid credentials",
@@ -43,13 +51,14 @@ def student_login(
 	access_token = create_access_token(
 		data={"sub": str(student.id), "role": "student"},
 		expires_delta=access_token_expires,
+		tenant=tenant,
 	)
 	return Token(access_token=access_token, token_type="bearer")
 
 
 def get_current_student(
 	credentials: HTTPAuthorizationCredentials = Depends(security),
-	session: Session = Depends(get_session),
+	session: Session = Depends(get_read_session),
 ) -> Student:
 	token = credentials.credentials
 	credentials_exception = HTTPException(
@@ -58,12 +67,12 @@ def get_current_student(
 	)
 
 	try:
-		payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+		payload = decode_access_token(token)
 		sub: str | None = payload.get("sub")
 		role: str | None = payload.get("role")
 		if sub is None or role != "student":
 			raise credentials_exception
-	except JWTError:
+	except InvalidTokenError:
 		raise credentials_exception
 
 	try:
@@ -80,16 +89,24 @@ def get_current_student(
 
 @router.post("/teacher-login", response_model=Token)
 def teacher_login(
-	payload: TeacherLogin, session: Session = Depends(get_session)
+	payload: TeacherLogin,
+	request: Request,
+	session: Session = Depends(get_read_session),
+	tenant: str = Depends(get_tenant),
 ) -> Token:
+	admit_login(request, tenant, "teacher", payload.teacher_id)
 	teacher = session.get(Teacher, payload.teacher_id)
 	if not teacher or not teacher.password_hash:
+		if not teacher:
+			remember_unknown(tenant, "teacher", payload.teacher_id)
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED,
 			detail="Invalid credentials",
 		)
 
-	if not verify_password(payload.password, teacher.password_hash):
+	with verify_slot():
+		valid = verify_password(payload.password, teacher.password_hash)
+	if not valid:
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED,
 			detail="Invalid credentials",
@@ -99,13 +116,14 @@ def teacher_login(
 	access_token = create_access_token(
 		data={"sub": str(teacher.id), "role": "teacher"},
 		expires_delta=access_token_expires,
+		tenant=tenant,
 	)
 	return Token(access_token=access_token, token_type="bearer")
 
 
 def get_current_teacher(
 	credentials: HTTPAuthorizationCredentials = Depends(security),
-	session: Session = Depends(get_session),
+	session: Session = Depends(get_read_session),
 ) -> Teacher:
 	token = credentials.credentials
 	credentials_exception = HTTPException(
@@ -114,12 +132,12 @@ def get_current_teacher(
 	)
 
 	try:
-		payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+		payload = decode_access_token(token)
 		sub: str | None = payload.get("sub")
 		role: str | None = payload.get("role")
 		if sub is None or role != "teacher":
 			raise credentials_exception
-	except JWTError:
+	except InvalidTokenError:
 		raise credentials_exception
 
 	try:
@@ -134,4 +152,9 @@ def get_current_teacher(
 	return teacher
 
 
-
+def get_current_admin(x_admin_key: str | None = Header(default=None)) -> None:
+	if not is_admin_key(x_admin_key):
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN,
+			detail="Admin key required",
+		)
@@ -4,20 +4,21 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import select, Session
 
-from ..database import get_session
-from ..models import Course, CourseCreate, CourseRead, CourseUpdate
+from ..database import get_read_session, get_write_session
+from ..loaders import fetch_by_ids
+from ..models import BatchGet, Course, CourseBatch, CourseCreate, CourseRead, CourseUpdate
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[CourseRead])
-def list_courses(session: Session = Depends(get_session)) -> List[Course]:
+def list_courses(session: Session = Depends(get_read_session)) -> List[Course]:
 	courses = session.exec(select(Course)).all()
 	return courses
 
 
 @router.post("/", response_model=CourseRead, status_code=status.HTTP_201_CREATED)
-def create_course(payload: CourseCreate, session: Session = Depends(get_session)) -> Course:
+def create_course(payload: CourseCreate, session: Session = Depends(get_write_session)) -> Course:
 	course = Course(**payload.model_dump())
 	session.add(course)
 	session.commit()
@@ -25,8 +26,15 @@ def create_course(payload: CourseCreate, session: Session = Depends(get_session)
 	return course
 
 
+@router.post("/batch-get", response_model=CourseBatch)
+def batch_get_courses(payload: BatchGet, session: Session = Depends(get_read_session)) -> CourseBatch:
+	"""Fetch many courses by ID in one query; unknown IDs are listed in ``missing``"""
+	items, missing = fetch_by_ids(session, Course, payload.ids)
+	return CourseBatch(items=items, missing=missing)
+
+
 @router.get("/{course_id}", response_model=CourseRead)
-def get_course(course_id: int, session: Session = Depends(get_session)) -> Course:
+def get_course(course_id: int, session: Session = Depends(get_read_session)) -> Course:
 	course = session.get(Course, course_id)
 	if not course:
 		raise HTTPException(status_code=404, detail="Course not found")
@@ -35,7 +43,7 @@ def get_course(course_id: int, session: Session = Depends(get_session)) -> Cours
 
 
 @router.patch("/{course_id}", response_model=CourseRead)
-def update_course(course_id: int, payload: CourseUpdate, session: Session = Depends(get_session)) -> Course:
+def update_course(course_id: int, payload: CourseUpdate, session: Session = Depends(get_write_session)) -> Course:
 	course = session.get(Course, course_id)
 	if not course:
 		raise HTTPException(status_code=404, detail="Course not found")
@@ -49,7 +57,7 @@ def update_course(course_id: int, payload: CourseUpdate, session: Session = Depe
 
 
 @router.delete("/{course_id}", status_code=status.HTTP_200_OK)
-def delete_course(course_id: int, session: Session = Depends(get_session)) -> dict:
+def delete_course(course_id: int, session: Session = Depends(get_write_session)) -> dict:
 	course = session.get(Course, course_id)
 	if not course:
 		raise HTTPException(status_code=404, detail="Course not found")
@@ -1,52 +1,140 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, NoReturn, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select, Session
 from pydantic import BaseModel
 
-from ..database import get_session
-from ..models import Enrollment, Student, Section, StudentInSection, Teacher
+from ..database import get_read_session, get_tenant, get_write_session
+from ..gpa import record_grade_change, update_ranking
+from ..loaders import fetch_by_ids
+from ..models import (
+	BatchGet,
+	Enrollment,
+	EnrollmentBatch,
+	Student,
+	Section,
+	StudentInSection,
+	Teacher,
+	Term,
+)
+from ..terms import enrollment_table, resolve_term
 from .auth import get_current_teacher
 
 router = APIRouter()
 
 
+def _adjust_enrolled_count(session: Session, section_id: int, delta: int) -> None:
+	"""Bump the section's seat count in the same transaction as the enrollment change"""
+	session.exec(  # type: ignore[call-overload]
+		update(Section)
+		.where(Section.id == section_id)
+		.values(enrolled_count=Section.enrolled_count + delta)
+	)
+
+
+def _raise_changed_or_missing(session: Session, enrollment_id: int) -> NoReturn:
+	"""A conditional write matched no row: it was either deleted or regraded meanwhile"""
+	if session.exec(select(Enrollment.id).where(Enrollment.id == enrollment_id)).first() is None:
+		raise HTTPException(status_code=404, detail="Enrollment not found")
+	raise HTTPException(
+		status_code=status.HTTP_409_CONFLICT,
+		detail="Enrollment was changed by another request; reload and retry",
+	)
+
+
 @router.post("/", response_model=Enrollment, status_code=status.HTTP_201_CREATED)
-def enroll_student(student_id: int, section_id: int, session: Session = Depends(get_session)) -> Enrollment:
+def enroll_student(
+	student_id: int,
+	section_id: int,
+	session: Session = Depends(get_write_session),
+	tenant: str = Depends(get_tenant),
+) -> Enrollment:
 	student = session.get(Student, student_id)
 	section = session.get(Section, section_id)
 	if not student:
 		raise HTTPException(status_code=404, detail="Student not found")
 	if not section:
 		raise HTTPException(status_code=404, detail="Section not found")
+	term = session.get(Term, section.term_id)
+	if term and term.closed_at:
+		raise HTTPException(status_code=400, detail="Term is closed")
 	# prevent duplicate
 	exists = session.exec(select(Enrollment).where(Enrollment.student_id == student_id, Enrollment.section_id == section_id)).first()
 	if exists:
 		raise HTTPException(status_code=400, detail="Student already enrolled in this section")
-	enrollment = Enrollment(student_id=student_id, section_id=section_id)
+	enrollment = Enrollment(student_id=student_id, section_id=section_id, term_id=section.term_id)
 	session.add(enrollment)
+	try:
+		# The unique index catches a concurrent enroll that passed the check above
+		session.flush()
+	except IntegrityError:
+		session.rollback()
+		raise HTTPException(status_code=400, detail="Student already enrolled in this section")
+	_adjust_enrolled_count(session, section_id, 1)
+	gpa_changed = record_grade_change(session, student_id, None, enrollment.grade)
 	session.commit()
 	session.refresh(enrollment)
+	if gpa_changed:
+		update_ranking(tenant, session, student_id)
 	return enrollment
 
 
+@router.post("/batch-get", response_model=EnrollmentBatch)
+def batch_get_enrollments(payload: BatchGet, session: Session = Depends(get_read_session)) -> EnrollmentBatch:
+	"""Fetch many enrollments by ID in one query; unknown IDs are listed in ``missing``"""
+	items, missing = fetch_by_ids(session, Enrollment, payload.ids)
+	return EnrollmentBatch(items=items, missing=missing)
+
+
 @router.delete("/{enrollment_id}", response_model=None, status_code=status.HTTP_200_OK)
-def unenroll(enrollment_id: int, session: Session = Depends(get_session)) -> dict:
+def unenroll(
+	enrollment_id: int,
+	session: Session = Depends(get_write_session),
+	tenant: str = Depends(get_tenant),
+) -> dict:
 	enrollment = session.get(Enrollment, enrollment_id)
 	if not enrollment:
 		raise HTTPException(status_code=404, detail="Enrollment not found")
-	session.delete(enrollment)
+	term = session.get(Term, enrollment.term_id)
+	if term and term.closed_at:
+		raise HTTPException(status_code=400, detail="Term is closed")
+	# Only the request whose DELETE removed the row, with the grade it read,
+	# adjusts the seat count and the GPA aggregate
+	deleted = session.exec(  # type: ignore[call-overload]
+		delete(Enrollment).where(
+			Enrollment.id == enrollment_id,
+			Enrollment.grade.is_not_distinct_from(enrollment.grade),  # type: ignore[union-attr]
+		)
+	)
+	if deleted.rowcount != 1:
+		session.rollback()
+		_raise_changed_or_missing(session, enrollment_id)
+	_adjust_enrolled_count(session, enrollment.section_id, -1)
+	gpa_changed = record_grade_change(session, enrollment.student_id, enrollment.grade, None)
 	session.commit()
+	if gpa_changed:
+		update_ranking(tenant, session, enrollment.student_id)
 	return {"detail": "Enrollment deleted"}
 
 
 @router.get("/student/{student_id}", response_model=List[Section])
-def list_student_sections(student_id: int, session: Session = Depends(get_session)) -> List[Section]:
+def list_student_sections(
+	student_id: int,
+	term_id: Optional[int] = None,
+	session: Session = Depends(get_read_session),
+) -> List[Section]:
+	"""Sections of the active term unless ``term_id`` asks for another one"""
 	student = session.get(Student, student_id)
 	if not student:
 		raise HTTPException(status_code=404, detail="Student not found")
-	enrollments = session.exec(select(Enrollment).where(Enrollment.student_id == student_id)).all()
+	term = resolve_term(session, term_id)
+	source = enrollment_table(term)
+	enrollments = session.exec(
+		select(source).where(source.student_id == student_id, source.term_id == term.id)
+	).all()
 	section_ids = [e.section_id for e in enrollments]
 	if not section_ids:
 		return []
@@ -55,13 +143,16 @@ def list_student_sections(student_id: int, session: Session = Depends(get_sessio
 
 
 @router.get("/section/{section_id}", response_model=List[StudentInSection])
-def list_section_students(section_id: int, session: Session = Depends(get_session)) -> List[StudentInSection]:
+def list_section_students(section_id: int, session: Session = Depends(get_read_session)) -> List[StudentInSection]:
 	"""Get all students in a section along with their enrollment IDs and grades"""
 	section = session.get(Section, section_id)
 	if not section:
 		raise HTTPException(status_code=404, detail="Section not found")
 	
-	enrollments = session.exec(select(Enrollment).where(Enrollment.section_id == section_id)).all()
+	# Sections of archived terms read their roster from the archive
+	term = resolve_term(session, section.term_id)
+	source = enrollment_table(term)
+	enrollments = session.exec(select(source).where(source.section_id == section_id)).all()
 	if not enrollments:
 		return []
 	
@@ -77,7 +168,7 @@ def list_section_students(section_id: int, session: Session = Depends(get_sessio
 		if student:
 			results.append(StudentInSection(
 				student_id=student.id,  # type: ignore[arg-type]
-				enrollment_id=enrollment.id,  # type: ignore[arg-type]
+				enrollment_id=getattr(enrollment, "enrollment_id", enrollment.id),  # type: ignore[arg-type]
 				first_name=student.first_name,
 				last_name=student.last_name,
 				email=student.email,
@@ -96,7 +187,8 @@ def update_enrollment_grade(
 	enrollment_id: int,
 	payload: GradeUpdate,
 	current_teacher: Teacher = Depends(get_current_teacher),
-	session: Session = Depends(get_session)
+	session: Session = Depends(get_write_session),
+	tenant: str = Depends(get_tenant),
 ) -> Enrollment:
 	"""Update the grade for a specific enrollment - TEACHERS ONLY"""
 	enrollment = session.get(Enrollment, enrollment_id)
@@ -114,9 +206,21 @@ def update_enrollment_grade(
 			detail="You can only update grades for sections you teach"
 		)
 	
-	enrollment.grade = payload.grade
-	session.add(enrollment)
+	# Conditional on the grade read above, so concurrent PATCHes cannot both
+	# apply their GPA delta against the same old grade
+	old_grade = enrollment.grade
+	updated = session.exec(  # type: ignore[call-overload]
+		update(Enrollment)
+		.where(Enrollment.id == enrollment_id, Enrollment.grade.is_not_distinct_from(old_grade))  # type: ignore[union-attr]
+		.values(grade=payload.grade)
+	)
+	if updated.rowcount != 1:
+		session.rollback()
+		_raise_changed_or_missing(session, enrollment_id)
+	gpa_changed = record_grade_change(session, enrollment.student_id, old_grade, payload.grade)
 	session.commit()
 	session.refresh(enrollment)
+	if gpa_changed:
+		update_ranking(tenant, session, enrollment.student_id)
 	return enrollment
 
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel import select, Session
+
+from ..database import get_read_session, get_tenant, get_write_session
+from ..jobs import PASSWORD_RESET, JobQueueFull, request_cancel, submit_job, take_secret
+from ..models import Job, JobRead, JobResult, JobStatus, PasswordResetJobCreate
+from .auth import get_current_admin
+
+router = APIRouter(dependencies=[Depends(get_current_admin)])
+
+
+@router.post("/password-resets", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+def create_password_reset_job(
+	payload: PasswordResetJobCreate,
+	tenant: str = Depends(get_tenant),
+) -> Job:
+	"""Reset passwords for a list of students, a section's roster, or everyone"""
+	selectors = [payload.student_ids is not None, payload.section_id is not None, payload.all]
+	if sum(selectors) != 1:
+		raise HTTPException(
+			status_code=400,
+			detail="Provide exactly one of student_ids, section_id or all",
+		)
+	try:
+		return submit_job(tenant, PASSWORD_RESET, payload.model_dump(exclude_none=True))
+	except JobQueueFull:
+		raise HTTPException(
+			status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+			detail="Too many jobs queued, try again later",
+		)
+
+
+@router.get("/", response_model=List[JobRead])
+def list_jobs(limit: int = 50, session: Session = Depends(get_read_session)) -> List[Job]:
+	return list(session.exec(select(Job).order_by(Job.id.desc()).limit(limit)).all())
+
+
+@router.get("/{job_id}", response_model=JobRead)
+def get_job(job_id: int, session: Session = Depends(get_read_session)) -> Job:
+	job = session.get(Job, job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail="Job not found")
+	return job
+
+
+@router.get("/{job_id}/result", response_model=JobResult)
+def get_job_result(job_id: int, session: Session = Depends(get_write_session)) -> JobResult:
+	"""The job's result; its secret (e.g. new passwords) is only in the first response"""
+	job = session.get(Job, job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail="Job not found")
+	if job.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+		raise HTTPException(status_code=409, detail="Job has not finished")
+	result = json.loads(job.result) if job.result else None
+	return JobResult(
+		id=job.id,  # type: ignore[arg-type]
+		status=job.status,
+		result=result,
+		secret=take_secret(session, job),
+	)
+
+
+@router.post("/{job_id}/cancel", response_model=JobRead)
+def cancel_job(job_id: int, session: Session = Depends(get_write_session)) -> Job:
+	job = session.get(Job, job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail="Job not found")
+	return request_cancel(session, job)
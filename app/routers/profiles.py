@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException
+
+from ..profiling import stored_profiles
+from .auth import get_current_admin
+
+router = APIRouter(dependencies=[Depends(get_current_admin)])
+
+
+@router.get("/")
+def list_profiles() -> List[Dict[str, Any]]:
+	"""Summaries of the most recent request profiles, newest first"""
+	return [
+		{key: value for key, value in profile.items() if key not in ("sql", "stats")}
+		for profile in reversed(stored_profiles())
+	]
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: int) -> Dict[str, Any]:
+	for profile in stored_profiles():
+		if profile["id"] == profile_id:
+			return profile
+	raise HTTPException(status_code=404, detail="Profile not found")
@@ -1,54 +1,192 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, Optional, Set
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import or_
 from sqlmodel import select, Session
 
-from ..database import get_session
-from ..models import Section, SectionCreate, SectionRead, Course, Teacher
+from ..database import get_read_session, get_write_session
+from ..terms import enrollment_table, resolve_term
+from ..loaders import by_id_loader, fetch_by_ids, parse_expand, students_by_section_loader
+from ..models import (
+	BatchGet,
+	Section,
+	SectionCreate,
+	SectionBatch,
+	SectionCatalogEntry,
+	SectionExpanded,
+	SectionRead,
+	SectionUpdate,
+	Course,
+	CourseRead,
+	Enrollment,
+	EnrollmentArchive,
+	StudentRead,
+	Subject,
+	Teacher,
+	TeacherRead,
+	Term,
+)
 
 router = APIRouter()
 
+SECTION_EXPANSIONS = ("course", "teacher", "students")
 
-@router.get("/", response_model=List[SectionRead])
-def list_sections(course_id: Optional[int] = None, teacher_id: Optional[int] = None, session: Session = Depends(get_session)) -> List[Section]:
-	query = select(Section)
+
+def expand_sections(session: Session, sections: List[Section], expand: Set[str]) -> List[SectionExpanded]:
+	"""Attach the requested relationships using one batched query per relationship"""
+	courses = by_id_loader(session, Course)
+	teachers = by_id_loader(session, Teacher)
+	# Rosters of archived terms live in enrollment_archive, one loader per table
+	students = {
+		table: students_by_section_loader(session, table) for table in (Enrollment, EnrollmentArchive)
+	}
+	terms = by_id_loader(session, Term)
+	if "students" in expand:
+		terms.load_many({section.term_id for section in sections})
+	roster_source = {}
+	for section in sections:
+		if "course" in expand:
+			courses.load(section.course_id)
+		if "teacher" in expand:
+			teachers.load(section.teacher_id)
+		if "students" in expand:
+			term = terms.get(section.term_id)
+			roster_source[section.id] = enrollment_table(term) if term else Enrollment
+			students[roster_source[section.id]].load(section.id)  # type: ignore[arg-type]
+	for loader in (courses, teachers, *students.values()):
+		loader.dispatch()
+
+	results: List[SectionExpanded] = []
+	for section in sections:
+		expanded = SectionExpanded.model_validate(section)
+		if "course" in expand:
+			course = courses.get(section.course_id)
+			expanded.course = CourseRead.model_validate(course) if course else None
+		if "teacher" in expand:
+			teacher = teachers.get(section.teacher_id)
+			expanded.teacher = TeacherRead.model_validate(teacher) if teacher else None
+		if "students" in expand:
+			roster = students[roster_source[section.id]].get(section.id) or []  # type: ignore[arg-type]
+			expanded.students = [StudentRead.model_validate(s) for s in roster]
+		results.append(expanded)
+	return results
+
+
+@router.get("/", response_model=List[SectionExpanded], response_model_exclude_unset=True)
+def list_sections(
+	course_id: Optional[int] = None,
+	teacher_id: Optional[int] = None,
+	term_id: Optional[int] = None,
+	expand: Optional[str] = None,
+	session: Session = Depends(get_read_session),
+) -> List[SectionExpanded]:
+	"""Sections of the active term unless ``term_id`` is given.
+
+	``expand`` is a comma-separated list of course, teacher and students.
+	"""
+	expansions = parse_expand(expand, SECTION_EXPANSIONS)
+	term = resolve_term(session, term_id)
+	query = select(Section).where(Section.term_id == term.id)
 	if course_id is not None:
 		query = query.where(Section.course_id == course_id)
 	if teacher_id is not None:
 		query = query.where(Section.teacher_id == teacher_id)
-	return session.exec(query).all()
+	return expand_sections(session, list(session.exec(query).all()), expansions)
 
 
 @router.post("/", response_model=SectionRead, status_code=status.HTTP_201_CREATED)
-def create_section(payload: SectionCreate, session: Session = Depends(get_session)) -> Section:
+def create_section(payload: SectionCreate, session: Session = Depends(get_write_session)) -> Section:
 	course = session.get(Course, payload.course_id)
 	teacher = session.get(Teacher, payload.teacher_id)
 	if not course:
 		raise HTTPException(status_code=404, detail="Course not found")
 	if not teacher:
 		raise HTTPException(status_code=404, detail="Teacher not found")
-	section = Section(**payload.model_dump())
+	term = resolve_term(session, payload.term_id)
+	if term.closed_at:
+		raise HTTPException(status_code=400, detail="Term is closed")
+	section = Section(**payload.model_dump(exclude={"term_id"}), term_id=term.id)
 	session.add(section)
 	session.commit()
 	session.refresh(section)
 	return section
 
 
-@router.get("/{section_id}", response_model=SectionRead)
-def get_section(section_id: int, session: Session = Depends(get_session)) -> Section:
+@router.post("/batch-get", response_model=SectionBatch)
+def batch_get_sections(payload: BatchGet, session: Session = Depends(get_read_session)) -> SectionBatch:
+	"""Fetch many sections by ID in one query; unknown IDs are listed in ``missing``"""
+	items, missing = fetch_by_ids(session, Section, payload.ids)
+	return SectionBatch(items=items, missing=missing)
+
+
+@router.get("/catalog", response_model=List[SectionCatalogEntry])
+def section_catalog(
+	subject: Optional[Subject] = None,
+	course_id: Optional[int] = None,
+	only_open: bool = False,
+	term_id: Optional[int] = None,
+	session: Session = Depends(get_read_session),
+) -> List[SectionCatalogEntry]:
+	"""Sections with their open seats, read from the maintained ``enrolled_count``"""
+	term = resolve_term(session, term_id)
+	query = (
+		select(Section, Course.title, Teacher.first_name, Teacher.last_name, Teacher.subject)
+		.join(Course, Course.id == Section.course_id)
+		.join(Teacher, Teacher.id == Section.teacher_id)
+		.where(Section.term_id == term.id)
+		.order_by(Section.id)
+	)
+	if subject is not None:
+		query = query.where(Teacher.subject == subject)
+	if course_id is not None:
+		query = query.where(Section.course_id == course_id)
+	if only_open:
+		query = query.where(or_(Section.capacity == None, Section.enrolled_count < Section.capacity))  # noqa: E711
+	return [
+		SectionCatalogEntry(
+			id=section.id,  # type: ignore[arg-type]
+			name=section.name,
+			course_id=section.course_id,
+			course_title=course_title,
+			teacher_id=section.teacher_id,
+			teacher_name=f"{first_name} {last_name}",
+			subject=teacher_subject,
+			capacity=section.capacity,
+			enrolled_count=section.enrolled_count,
+			seats_remaining=None if section.capacity is None else max(section.capacity - section.enrolled_count, 0),
+		)
+		for section, course_title, first_name, last_name, teacher_subject in session.exec(query).all()
+	]
+
+
+@router.get("/{section_id}", response_model=SectionExpanded, response_model_exclude_unset=True)
+def get_section(
+	section_id: int,
+	expand: Optional[str] = None,
+	session: Session = Depends(get_read_session),
+) -> SectionExpanded:
+	expansions = parse_expand(expand, SECTION_EXPANSIONS)
 	section = session.get(Section, section_id)
 	if not section:
 		raise HTTPException(status_code=404, detail="Section not found")
-	return section
+	return expand_sections(session, [section], expansions)[0]
 
 
 @router.patch("/{section_id}", response_model=SectionRead)
-def update_section(section_id: int, payload: SectionCreate, session: Session = Depends(get_session)) -> Section:
+def update_section(section_id: int, payload: SectionUpdate, session: Session = Depends(get_write_session)) -> Section:
 	section = session.get(Section, section_id)
 	if not section:
 		raise HTTPException(status_code=404, detail="Section not found")
-	for key, value in payload.model_dump(exclude_unset=True).items():
+	updates = payload.model_dump(exclude_unset=True)
+	for key in ("name", "course_id", "teacher_id"):
+		if key in updates and updates[key] is None:
+			raise HTTPException(status_code=400, detail=f"{key} cannot be null")
+	if "course_id" in updates and not session.get(Course, updates["course_id"]):
+		raise HTTPException(status_code=404, detail="Course not found")
+	if "teacher_id" in updates and not session.get(Teacher, updates["teacher_id"]):
+		raise HTTPException(status_code=404, detail="Teacher not found")
+	for key, value in updates.items():
 		setattr(section, key, value)
 	session.add(section)
 	session.commit()
@@ -57,7 +195,7 @@ def update_section(section_id: int, payload: SectionCreate, session: Session = D
 
 
 @router.delete("/{section_id}", response_model=None, status_code=status.HTTP_200_OK)
-def delete_section(section_id: int, session: Session = Depends(get_session)) -> dict:
+def delete_section(section_id: int, session: Session = Depends(get_write_session)) -> dict:
 	section = session.get(Section, section_id)
 	if not section:
 		raise HTTPException(status_code=404, detail="Section not found")
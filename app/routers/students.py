@@ -1,59 +1,98 @@
 from __future__ import annotations
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlmodel import select, Session
 
-from ..database import get_session
+from ..database import get_read_session, get_tenant, get_write_session
+from ..gpa import MAX_RANKING_LIMIT, forget_student, get_rankings, update_ranking
+from ..loaders import fetch_by_ids
 from ..models import (
+	BatchGet,
 	Student,
+	StudentBatch,
 	StudentCreate,
+	StudentGpa,
+	StudentGpaRead,
+	StudentRank,
 	StudentRead,
 	StudentUpdate,
-	Enrollment,
 	Section,
 	Course,
 	Teacher,
 	StudentClassWithGrade,
 )
 from .auth import get_current_student
-from ..security import get_password_hash
-import secrets
-import string
+from ..projection import field_response, fields_response, parse_fields, select_fields
+from ..security import generate_temp_password, get_password_hash
+from ..terms import enrollment_table, resolve_term
+from ..throttle import forget_unknown
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[StudentRead])
-def list_students(session: Session = Depends(get_session)) -> List[Student]:
-	print("this is my debug statement: list_students", session)
-	students = session.exec(select(Student)).all()
-	return students
+def list_students(
+	fields: Optional[str] = None, session: Session = Depends(get_read_session)
+) -> Response:
+	"""``fields`` is a comma-separated subset of StudentRead; only those columns are read."""
+	columns = parse_fields(fields, StudentRead)
+	return fields_response(StudentRead, columns, select_fields(session, Student, columns))
 
 
 @router.post("/", response_model=StudentRead, status_code=status.HTTP_201_CREATED)
-def create_student(payload: StudentCreate, session: Session = Depends(get_session)) -> Student:
+def create_student(
+	payload: StudentCreate,
+	session: Session = Depends(get_write_session),
+	tenant: str = Depends(get_tenant),
+) -> Student:
 	try:
 		student = Student(**payload.model_dump())
 		session.add(student)
 		session.commit()
 		session.refresh(student)
+		forget_unknown(tenant, "student", student.id)  # type: ignore[arg-type]
 		return student
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error creating student: {str(e)}")
 
 
+@router.post("/batch-get", response_model=StudentBatch)
+def batch_get_students(payload: BatchGet, session: Session = Depends(get_read_session)) -> StudentBatch:
+	"""Fetch many students by ID in one query; unknown IDs are listed in ``missing``"""
+	items, missing = fetch_by_ids(session, Student, payload.ids)
+	return StudentBatch(items=items, missing=missing)
+
+
+@router.get("/rankings", response_model=List[StudentRank])
+def list_top_students(
+	limit: int = Query(10, ge=1, le=MAX_RANKING_LIMIT),
+	session: Session = Depends(get_read_session),
+	tenant: str = Depends(get_tenant),
+) -> List[StudentRank]:
+	"""Students with the highest GPA; tied students share a rank"""
+	return [
+		StudentRank(rank=rank, student_id=student_id, gpa=gpa)
+		for rank, student_id, gpa in get_rankings(tenant, session).top(limit)
+	]
+
+
 @router.get("/{student_id}", response_model=StudentRead)
-def get_student(student_id: int, session: Session = Depends(get_session)) -> Student:
-	student = session.get(Student, student_id)
-	if not student:
+def get_student(
+	student_id: int,
+	fields: Optional[str] = None,
+	session: Session = Depends(get_read_session),
+) -> Response:
+	columns = parse_fields(fields, StudentRead)
+	rows = select_fields(session, Student, columns, Student.id == student_id)
+	if not rows:
 		raise HTTPException(status_code=404, detail="Student not found")
-	return student
+	return field_response(StudentRead, columns, rows[0])
 
 
 @router.patch("/{student_id}", response_model=StudentRead)
-def update_student(student_id: int, payload: StudentUpdate, session: Session = Depends(get_session)) -> Student:
+def update_student(student_id: int, payload: StudentUpdate, session: Session = Depends(get_write_session)) -> Student:
 	student = session.get(Student, student_id)
 	if not student:
 		raise HTTPException(status_code=404, detail="Student not found")
@@ -67,12 +106,18 @@ def update_student(student_id: int, payload: StudentUpdate, session: Session = D
 
 
 @router.delete("/{student_id}", status_code=status.HTTP_200_OK)
-def delete_student(student_id: int, session: Session = Depends(get_session)) -> dict:
+def delete_student(
+	student_id: int,
+	session: Session = Depends(get_write_session),
+	tenant: str = Depends(get_tenant),
+) -> dict:
 	student = session.get(Student, student_id)
 	if not student:
 		raise HTTPException(status_code=404, detail="Student not found")
+	forget_student(session, student_id)
 	session.delete(student)
 	session.commit()
+	update_ranking(tenant, session, student_id)
 	return {"detail": "Student deleted"}
 
 
@@ -81,14 +126,19 @@ def delete_student(student_id: int, session: Session = Depends(get_session)) ->
 	response_model=List[StudentClassWithGrade],
 )
 def get_student_classes_with_grades(
-	student_id: int, session: Session = Depends(get_session)
+	student_id: int,
+	term_id: Optional[int] = None,
+	session: Session = Depends(get_read_session),
 ) -> List[StudentClassWithGrade]:
+	"""Classes of the active term unless ``term_id`` asks for another (archived) one"""
 	student = session.get(Student, student_id)
 	if not student:
 		raise HTTPException(status_code=404, detail="Student not found")
 
+	term = resolve_term(session, term_id)
+	source = enrollment_table(term)
 	enrollments = session.exec(
-		select(Enrollment).where(Enrollment.student_id == student_id)
+		select(source).where(source.student_id == student_id, source.term_id == term.id)
 	).all()
 	if not enrollments:
 		return []
@@ -123,23 +173,42 @@ def get_student_classes_with_grades(
 	return results
 
 
+@router.get("/by-id/{student_id}/gpa", response_model=StudentGpaRead)
+def get_student_gpa(
+	student_id: int,
+	session: Session = Depends(get_read_session),
+	tenant: str = Depends(get_tenant),
+) -> StudentGpaRead:
+	"""GPA over every graded class, including archived terms, and class rank"""
+	if not session.get(Student, student_id):
+		raise HTTPException(status_code=404, detail="Student not found")
+	aggregate = session.get(StudentGpa, student_id)
+	rankings = get_rankings(tenant, session)
+	return StudentGpaRead(
+		student_id=student_id,
+		gpa=aggregate.gpa if aggregate else None,
+		graded_count=aggregate.graded_count if aggregate else 0,
+		rank=rankings.rank(student_id),
+		ranked_students=len(rankings),
+	)
+
+
 @router.get(
 	"/me/classes-with-grades",
 	response_model=List[StudentClassWithGrade],
 )
 def get_my_classes_with_grades(
+	term_id: Optional[int] = None,
 	current_student: Student = Depends(get_current_student),
-	session: Session = Depends(get_session),
+	session: Session = Depends(get_read_session),
 ) -> List[StudentClassWithGrade]:
 	return get_student_classes_with_grades(
 		student_id=current_student.id,  # type: ignore[arg-type]
+		term_id=term_id,
 		session=session,
 	)
-def generate_temp_password(length: int = 10) -> str:
-    chars = string.ascii_letters + string.digits
-    return "".join(secrets.choice(chars) for _ in range(length))
 @router.post("/{student_id}/reset-password")
-def reset_student_password(student_id:int, session: Session = Depends(get_session), ) -> dict:
+def reset_student_password(student_id:int, session: Session = Depends(get_write_session), ) -> dict:
 	student = session.get(Student, student_id)
 	if not student:
 		raise HTTPException(status_code=404, detail="Student not found")
@@ -1,41 +1,86 @@
 from __future__ import annotations
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlmodel import select, Session
 
-from ..database import get_session
-from ..models import Teacher, TeacherCreate, TeacherRead, TeacherUpdate, Section, SectionRead
+from ..database import get_read_session, get_tenant, get_write_session
+from ..loaders import fetch_by_ids, parse_expand, sections_by_teacher_loader
+from ..models import (
+	BatchGet,
+	Teacher,
+	TeacherBatch,
+	TeacherCreate,
+	TeacherRead,
+	TeacherUpdate,
+	TeacherWithSections,
+	Section,
+	SectionRead,
+)
+from ..projection import field_response, fields_response, parse_fields, select_fields
+from ..terms import resolve_term
+from ..throttle import forget_unknown
 from .auth import get_current_teacher
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[TeacherRead])
-def list_teachers(session: Session = Depends(get_session)) -> List[Teacher]:
-	teachers = session.exec(select(Teacher)).all()
-	return teachers
+def list_teachers(
+	fields: Optional[str] = None, session: Session = Depends(get_read_session)
+) -> Response:
+	"""``fields`` is a comma-separated subset of TeacherRead; only those columns are read."""
+	columns = parse_fields(fields, TeacherRead)
+	return fields_response(TeacherRead, columns, select_fields(session, Teacher, columns))
 
 
 @router.post("/", response_model=TeacherRead, status_code=status.HTTP_201_CREATED)
-def create_teacher(payload: TeacherCreate, session: Session = Depends(get_session)) -> Teacher:
+def create_teacher(
+	payload: TeacherCreate,
+	session: Session = Depends(get_write_session),
+	tenant: str = Depends(get_tenant),
+) -> Teacher:
 	teacher = Teacher(**payload.model_dump())
 	session.add(teacher)
 	session.commit()
 	session.refresh(teacher)
+	forget_unknown(tenant, "teacher", teacher.id)  # type: ignore[arg-type]
 	return teacher
 
 
-@router.get("/{teacher_id}", response_model=TeacherRead)
-def get_teacher(teacher_id: int, session: Session = Depends(get_session)) -> Teacher:
-	teacher = session.get(Teacher, teacher_id)
-	if not teacher:
+@router.post("/batch-get", response_model=TeacherBatch)
+def batch_get_teachers(payload: BatchGet, session: Session = Depends(get_read_session)) -> TeacherBatch:
+	"""Fetch many teachers by ID in one query; unknown IDs are listed in ``missing``"""
+	items, missing = fetch_by_ids(session, Teacher, payload.ids)
+	return TeacherBatch(items=items, missing=missing)
+
+
+@router.get("/{teacher_id}", response_model=TeacherWithSections, response_model_exclude_unset=True)
+def get_teacher(
+	teacher_id: int,
+	fields: Optional[str] = None,
+	expand: Optional[str] = None,
+	term_id: Optional[int] = None,
+	session: Session = Depends(get_read_session),
+) -> Response:
+	"""``expand=sections`` includes the sections this teacher teaches in the
+	active term, or in ``term_id``"""
+	expansions = parse_expand(expand, ("sections",))
+	columns = parse_fields(fields, TeacherRead)
+	rows = select_fields(session, Teacher, columns, Teacher.id == teacher_id)
+	if not rows:
 		raise HTTPException(status_code=404, detail="Teacher not found")
-	return teacher
+	row = rows[0]
+	if "sections" in expansions:
+		sections = sections_by_teacher_loader(session, resolve_term(session, term_id).id)  # type: ignore[arg-type]
+		sections.load(teacher_id)
+		row["sections"] = [SectionRead.model_validate(s) for s in sections.get(teacher_id) or []]
+		return field_response(TeacherWithSections, columns + ("sections",), row)
+	return field_response(TeacherRead, columns, row)
 
 
 @router.patch("/{teacher_id}", response_model=TeacherRead)
-def update_teacher(teacher_id: int, payload: TeacherUpdate, session: Session = Depends(get_session)) -> Teacher:
+def update_teacher(teacher_id: int, payload: TeacherUpdate, session: Session = Depends(get_write_session)) -> Teacher:
 	teacher = session.get(Teacher, teacher_id)
 	if not teacher:
 		raise HTTPException(status_code=404, detail="Teacher not found")
@@ -49,7 +94,7 @@ def update_teacher(teacher_id: int, payload: TeacherUpdate, session: Session = D
 
 
 @router.delete("/{teacher_id}", status_code=status.HTTP_200_OK)
-def delete_teacher(teacher_id: int, session: Session = Depends(get_session)) -> dict:
+def delete_teacher(teacher_id: int, session: Session = Depends(get_write_session)) -> dict:
 	teacher = session.get(Teacher, teacher_id)
 	if not teacher:
 		raise HTTPException(status_code=404, detail="Teacher not found")
@@ -60,11 +105,13 @@ def delete_teacher(teacher_id: int, session: Session = Depends(get_session)) ->
 
 @router.get("/me/sections", response_model=List[SectionRead])
 def get_my_sections(
+	term_id: Optional[int] = None,
 	current_teacher: Teacher = Depends(get_current_teacher),
-	session: Session = Depends(get_session)
+	session: Session = Depends(get_read_session)
 ) -> List[Section]:
-	"""Get all sections for the currently logged-in teacher"""
+	"""Get the logged-in teacher's sections for the active term (or ``term_id``)"""
+	term = resolve_term(session, term_id)
 	sections = session.exec(
-		select(Section).where(Section.teacher_id == current_teacher.id)
+		select(Section).where(Section.teacher_id == current_teacher.id, Section.term_id == term.id)
 	).all()
 	return list(sections)
\ No newline at end of file
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import update
+from sqlmodel import select, Session
+
+from ..database import get_read_session, get_tenant, get_write_session
+from ..jobs import JobQueueFull, submit_job
+from ..models import Job, JobRead, Term, TermCreate, TermRead
+from ..terms import ARCHIVE_TERM
+from .auth import get_current_admin
+
+router = APIRouter(dependencies=[Depends(get_current_admin)])
+
+
+@router.get("/", response_model=List[TermRead])
+def list_terms(session: Session = Depends(get_read_session)) -> List[Term]:
+	return list(session.exec(select(Term).order_by(Term.id)).all())
+
+
+@router.post("/", response_model=TermRead, status_code=status.HTTP_201_CREATED)
+def create_term(payload: TermCreate, session: Session = Depends(get_write_session)) -> Term:
+	term = Term(**payload.model_dump())
+	session.add(term)
+	session.commit()
+	session.refresh(term)
+	return term
+
+
+def _get_term(session: Session, term_id: int) -> Term:
+	term = session.get(Term, term_id)
+	if not term:
+		raise HTTPException(status_code=404, detail="Term not found")
+	return term
+
+
+@router.post("/{term_id}/activate", response_model=TermRead)
+def activate_term(term_id: int, session: Session = Depends(get_write_session)) -> Term:
+	"""Make this the term that rosters, transcripts and section lists default to"""
+	term = _get_term(session, term_id)
+	if term.closed_at:
+		raise HTTPException(status_code=400, detail="Term is closed")
+	session.exec(update(Term).where(Term.id != term_id).values(is_active=False))  # type: ignore[call-overload]
+	term.is_active = True
+	session.add(term)
+	session.commit()
+	session.refresh(term)
+	return term
+
+
+@router.post("/{term_id}/close", response_model=TermRead)
+def close_term(term_id: int, session: Session = Depends(get_write_session)) -> Term:
+	"""Stop enrollment changes for a term so it can be archived"""
+	term = _get_term(session, term_id)
+	if term.is_active:
+		raise HTTPException(status_code=400, detail="Activate another term before closing this one")
+	if not term.closed_at:
+		term.closed_at = datetime.now(timezone.utc)
+		session.add(term)
+		session.commit()
+		session.refresh(term)
+	return term
+
+
+@router.post("/{term_id}/archive", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+def archive_term(
+	term_id: int,
+	session: Session = Depends(get_read_session),
+	tenant: str = Depends(get_tenant),
+) -> Job:
+	"""Move a closed term's enrollments to the archive table in a background job"""
+	term = _get_term(session, term_id)
+	if not term.closed_at:
+		raise HTTPException(status_code=400, detail="Close the term before archiving it")
+	if term.archived_at:
+		raise HTTPException(status_code=400, detail="Term is already archived")
+	try:
+		return submit_job(tenant, ARCHIVE_TERM, {"term_id": term_id})
+	except JobQueueFull:
+		raise HTTPException(
+			status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+			detail="Too many jobs queued, try again later",
+		)
@@ -1,33 +1,85 @@
 from __future__ import annotations
 
+import base64
+import hashlib
+import secrets
+import string
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict
 
-from jose import jwt
-from passlib.context import CryptContext
+if TYPE_CHECKING:
+	from cryptography.fernet import Fernet
+	from passlib.context import CryptContext
 
 
 # In a real app, move these to environment variables
 SECRET_KEY = "change-me-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+TENANT_CLAIM = "tenant"
+# Shared key for admin-only endpoints such as stored request profiles
+ADMIN_API_KEY = "change-me-admin-key"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class InvalidTokenError(Exception):
+	pass
+
+
+# passlib and jose are imported on first use to keep worker cold start fast
+@lru_cache(maxsize=None)
+def get_pwd_context() -> CryptContext:
+	from passlib.context import CryptContext
+	return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_password(plain_password: str, password_hash: str) -> bool:
-	return pwd_context.verify(plain_password, password_hash)
+	return get_pwd_context().verify(plain_password, password_hash)
 
 
 def get_password_hash(password: str) -> str:
-	return pwd_context.hash(password)
+	return get_pwd_context().hash(password)
+
+
+def is_admin_key(key: str | None) -> bool:
+	return key is not None and secrets.compare_digest(key, ADMIN_API_KEY)
+
+
+@lru_cache(maxsize=None)
+def _fernet() -> Fernet:
+	from cryptography.fernet import Fernet
+	return Fernet(base64.urlsafe_b64encode(hashlib.sha256(SECRET_KEY.encode()).digest()))
+
+
+def encrypt_secret(plaintext: str) -> str:
+	return _fernet().encrypt(plaintext.encode()).decode()
+
+
+def decrypt_secret(token: str, max_age_seconds: int) -> str | None:
+	"""The plaintext, or None once the token is older than ``max_age_seconds``"""
+	from cryptography.fernet import InvalidToken
+
+	try:
+		return _fernet().decrypt(token.encode(), ttl=max_age_seconds).decode()
+	except InvalidToken:
+		return None
+
+
+def generate_temp_password(length: int = 10) -> str:
+	chars = string.ascii_letters + string.digits
+	return "".join(secrets.choice(chars) for _ in range(length))
 
 
 def create_access_token(
 	data: Dict[str, Any],
 	expires_delta: timedelta | None = None,
+	tenant: str | None = None,
 ) -> str:
+	from jose import jwt
+
 	to_encode = data.copy()
+	if tenant is not None:
+		to_encode[TENANT_CLAIM] = tenant
 	now = datetime.now(timezone.utc)
 	if expires_delta is None:
 		expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -37,4 +89,13 @@ def create_access_token(
 	return encoded_jwt
 
 
+def decode_access_token(token: str) -> Dict[str, Any]:
+	from jose import JWTError, jwt
+
+	try:
+		return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+	except JWTError as exc:
+		raise InvalidTokenError(str(exc)) from exc
+
+
 
@@ -6,8 +6,10 @@ import random
 from sqlmodel import Session, select
 
 from .database import engine
+from .gpa import rebuild_student_gpa
 from .models import Course, Teacher, Section, Subject, Student, Enrollment
 from .security import get_password_hash
+from .terms import get_active_term
 
 FIRST_NAMES = [
 	"Ava", "Liam", "Emma", "Noah", "Olivia", "Elijah", "Sophia", "Lucas", "Isabella", "Mason",
@@ -67,7 +69,8 @@ def seed() -> None:
 				session.add(teacher)
 		session.commit()
 
-		# Sections: 3 per teacher for their course
+		# Sections: 3 per teacher for their course, in the active term
+		term = get_active_term(session)
 		for teacher in teachers:
 			course = course_by_subject[teacher.subject]
 			for n in range(1, 4):
@@ -79,7 +82,9 @@ def seed() -> None:
 					)
 				).first():
 					continue
-				section = Section(name=name, capacity=30, course_id=course.id, teacher_id=teacher.id)
+				section = Section(
+					name=name, capacity=30, course_id=course.id, teacher_id=teacher.id, term_id=term.id
+				)
 				session.add(section)
 				session.commit()
 
@@ -115,7 +120,7 @@ def seed() -> None:
 		session.commit()
 
 		# Enrollments: enroll each student in a few random sections
-		all_sections = session.exec(select(Section)).all()
+		all_sections = session.exec(select(Section).where(Section.term_id == term.id)).all()
 
 		if all_students and all_sections:
 			for student in all_students:
@@ -135,11 +140,18 @@ def seed() -> None:
 					enrollment = Enrollment(
 						student_id=student.id,
 						section_id=section.id,
+						term_id=section.term_id,
 						grade=grade,
 					)
 					session.add(enrollment)
+					section.enrolled_count += 1
+					session.add(section)
 			session.commit()
 
+		# GPA aggregates for the grades seeded above
+		rebuild_student_gpa(session)
+		session.commit()
+
 
 if __name__ == "__main__":
 	from app.database import init_db
@@ -0,0 +1,85 @@
+"""Academic terms and archival of closed terms.
+
+Hot-path queries are scoped to the active term. Once a term is closed, the
+``archive_term`` job moves its enrollments from ``enrollment`` into
+``enrollment_archive`` in a single transaction, so the hot table only holds
+live terms while historical transcripts and rosters stay queryable.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Type, Union
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert
+from sqlmodel import Session, select
+
+from .jobs import JobContext, job_handler
+from .models import Enrollment, EnrollmentArchive, Term
+
+ARCHIVE_TERM = "archive_term"
+
+
+def get_active_term(session: Session) -> Term:
+	term = session.exec(select(Term).where(Term.is_active == True)).first()  # noqa: E712
+	if not term:
+		raise HTTPException(status_code=409, detail="No active term")
+	return term
+
+
+def resolve_term(session: Session, term_id: Optional[int]) -> Term:
+	"""The requested term, or the active term when none is given"""
+	if term_id is None:
+		return get_active_term(session)
+	term = session.get(Term, term_id)
+	if not term:
+		raise HTTPException(status_code=404, detail="Term not found")
+	return term
+
+
+def enrollment_table(term: Term) -> Union[Type[Enrollment], Type[EnrollmentArchive]]:
+	"""Where a term's enrollments live: the hot table, or the archive once archived"""
+	return EnrollmentArchive if term.archived_at else Enrollment
+
+
+@job_handler(ARCHIVE_TERM)
+def archive_term(context: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+	"""Move a closed term's enrollments in one transaction.
+
+	The copy, the delete and ``archived_at`` commit together, because
+	:func:`enrollment_table` reads a term from exactly one table; a partial
+	move would hide rows from transcripts and rosters.
+	"""
+	session = context.session
+	term = session.get(Term, params["term_id"])
+	if not term:
+		raise ValueError("Term not found")
+	if term.is_active or not term.closed_at:
+		raise ValueError("Only closed, inactive terms can be archived")
+
+	enrollment = Enrollment.__table__  # type: ignore[attr-defined]
+	archive = EnrollmentArchive.__table__  # type: ignore[attr-defined]
+	in_term = enrollment.c.term_id == term.id
+	total = session.exec(select(func.count()).select_from(enrollment).where(in_term)).one()
+	context.set_total(total)
+	context.check_cancelled()
+
+	conn = session.connection()
+	conn.execute(
+		insert(archive).from_select(
+			["enrollment_id", "student_id", "section_id", "term_id", "grade"],
+			select(
+				enrollment.c.id,
+				enrollment.c.student_id,
+				enrollment.c.section_id,
+				enrollment.c.term_id,
+				enrollment.c.grade,
+			).where(in_term),
+		)
+	)
+	archived = conn.execute(delete(enrollment).where(in_term)).rowcount
+	term.archived_at = datetime.now(timezone.utc)
+	session.add(term)
+	# Commits the move and archived_at together with the progress update
+	context.advance(archived)
+	return {"term_id": term.id, "archived": archived}
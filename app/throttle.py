@@ -0,0 +1,155 @@
+"""Admission control for the login routes.
+
+Every login attempt that reaches ``verify_password`` costs a full bcrypt
+verify, so attempts are limited per account ID and per client IP, the
+number of verifies running at once is capped, and IDs that do not exist are
+remembered briefly so retries for them skip the database.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator
+
+from fastapi import HTTPException, Request, status
+
+# Token buckets: sustained attempts per second and burst size
+LOGIN_ID_RATE = 5 / 60
+LOGIN_ID_BURST = 5
+LOGIN_IP_RATE = 1.0
+LOGIN_IP_BURST = 20
+
+MAX_CONCURRENT_VERIFIES = 2 * (os.cpu_count() or 1)
+UNKNOWN_ID_TTL_SECONDS = 30.0
+
+# Upper bound on tracked keys so a flood of distinct IDs or IPs cannot grow memory
+MAX_TRACKED_KEYS = 10_000
+
+
+class TokenBucket:
+	def __init__(self, rate: float, burst: int) -> None:
+		self.rate = rate
+		self.burst = burst
+		self.tokens = float(burst)
+		self.updated = time.monotonic()
+
+	def take(self) -> float:
+		"""Consume a token; returns 0 on success or the seconds until one is free"""
+		now = time.monotonic()
+		self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		if self.tokens >= 1:
+			self.tokens -= 1
+			return 0.0
+		return (1 - self.tokens) / self.rate
+
+
+class KeyedBuckets:
+	def __init__(self, rate: float, burst: int, max_keys: int = MAX_TRACKED_KEYS) -> None:
+		self.rate = rate
+		self.burst = burst
+		self.max_keys = max_keys
+		self._buckets: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def take(self, key: Hashable) -> float:
+		with self._lock:
+			bucket = self._buckets.get(key)
+			if bucket is None:
+				bucket = TokenBucket(self.rate, self.burst)
+				self._buckets[key] = bucket
+				if len(self._buckets) > self.max_keys:
+					self._buckets.popitem(last=False)
+			else:
+				self._buckets.move_to_end(key)
+			return bucket.take()
+
+
+class NegativeCache:
+	"""Short-lived memory of keys known not to exist"""
+
+	def __init__(self, ttl: float, max_keys: int = MAX_TRACKED_KEYS) -> None:
+		self.ttl = ttl
+		self.max_keys = max_keys
+		self._expires: Dict[Hashable, float] = {}
+		self._lock = threading.Lock()
+
+	def __contains__(self, key: Hashable) -> bool:
+		expires = self._expires.get(key)
+		if expires is None:
+			return False
+		if expires < time.monotonic():
+			self._expires.pop(key, None)
+			return False
+		return True
+
+	def add(self, key: Hashable) -> None:
+		with self._lock:
+			now = time.monotonic()
+			if len(self._expires) >= self.max_keys:
+				for stale in [k for k, t in self._expires.items() if t < now]:
+					del self._expires[stale]
+				if len(self._expires) >= self.max_keys:
+					self._expires.clear()
+			self._expires[key] = now + self.ttl
+
+	def discard(self, key: Hashable) -> None:
+		self._expires.pop(key, None)
+
+
+login_id_buckets = KeyedBuckets(LOGIN_ID_RATE, LOGIN_ID_BURST)
+login_ip_buckets = KeyedBuckets(LOGIN_IP_RATE, LOGIN_IP_BURST)
+unknown_ids = NegativeCache(UNKNOWN_ID_TTL_SECONDS)
+_verify_slots = threading.BoundedSemaphore(MAX_CONCURRENT_VERIFIES)
+
+
+def _too_many_requests(retry_after: float) -> HTTPException:
+	return HTTPException(
+		status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+		detail="Too many login attempts, try again later",
+		headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+	)
+
+
+def _invalid_credentials() -> HTTPException:
+	return HTTPException(
+		status_code=status.HTTP_401_UNAUTHORIZED,
+		detail="Invalid credentials",
+	)
+
+
+def admit_login(request: Request, tenant: str, role: str, account_id: int) -> None:
+	"""Reject a login attempt before it touches the database or bcrypt"""
+	client = request.client.host if request.client else ""
+	wait = login_ip_buckets.take((tenant, client))
+	if wait:
+		raise _too_many_requests(wait)
+	if (tenant, role, account_id) in unknown_ids:
+		raise _invalid_credentials()
+	wait = login_id_buckets.take((tenant, role, account_id))
+	if wait:
+		raise _too_many_requests(wait)
+
+
+def remember_unknown(tenant: str, role: str, account_id: int) -> None:
+	unknown_ids.add((tenant, role, account_id))
+
+
+def forget_unknown(tenant: str, role: str, account_id: int) -> None:
+	"""Call when an account is created so it can log in immediately"""
+	unknown_ids.discard((tenant, role, account_id))
+
+
+@contextmanager
+def verify_slot() -> Iterator[None]:
+	"""Hold one of the bcrypt verify slots, or fail fast with 429"""
+	if not _verify_slots.acquire(blocking=False):
+		raise _too_many_requests(1)
+	try:
+		yield
+	finally:
+		_verify_slots.release()